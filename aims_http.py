@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""Plain-HTTP ticket lookup for the AIMS ticket search (no Chrome).
+
+Mirrors what process() does in the browser: load the search form, POST
+plate_vin/ticket_number, read "Ticket Information" and the related
+"View ticket #…" links, then GET each related ticket's detail page.
+Anything that doesn't look like the pages we know raises LookupParseError
+so the caller can fall back to Selenium.
+"""
+import re
+import threading
+import time
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import urljoin
+
+import requests
+
+class LookupParseError(Exception):
+    """The response didn't look like an AIMS page we know how to read."""
+
+class TicketPage:
+    def __init__(self, citation=None, location=None, issue_date=None, related=None):
+        self.citation   = citation
+        self.location   = location
+        self.issue_date = issue_date
+        self.related    = related or {}   # citation → absolute detail URL
+
+class _AimsParser(HTMLParser):
+    """Collects the bits of an AIMS page that _extract_ticket_meta reads."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.has_ticket_info = False
+        self.fields  = {}          # "Location:" → "162 OAKES COLLEGE"
+        self.links   = []          # (aria-label, href)
+        self.form    = None        # (action, method, {name: value}) of the search form
+        self._forms  = []
+        self._h3     = None
+        self._p      = None
+        self._strong = None
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag == "h3":
+            self._h3 = []
+        elif tag == "p":
+            self._p = []
+            self._strong = None
+        elif tag == "strong" and self._p is not None:
+            self._strong = []
+        elif tag == "a" and "View ticket" in (a.get("aria-label") or ""):
+            self.links.append((a["aria-label"], a.get("href") or ""))
+        elif tag == "form":
+            self._forms.append([a.get("action") or "", (a.get("method") or "get").lower(), {}, False])
+        elif tag in ("input", "button", "select", "textarea") and self._forms:
+            name = a.get("name") or a.get("id")
+            if not name:
+                return
+            f = self._forms[-1]
+            if a.get("id") == "plate_vin" or name == "plate_vin":
+                f[3] = True
+            typ = (a.get("type") or "").lower()
+            if tag == "button" or typ in ("submit", "button"):
+                if a.get("id") == "search_ticket" and a.get("name"):
+                    f[2][a["name"]] = a.get("value", "")
+                return
+            if typ in ("checkbox", "radio") and "checked" not in a:
+                return
+            f[2][name] = a.get("value", "")
+
+    def handle_endtag(self, tag):
+        if tag == "h3" and self._h3 is not None:
+            if " ".join("".join(self._h3).split()) == "Ticket Information":
+                self.has_ticket_info = True
+            self._h3 = None
+        elif tag == "strong" and self._strong is not None and self._p is not None:
+            self._p.append(("label", "".join(self._strong).strip()))
+            self._strong = None
+        elif tag == "p" and self._p is not None:
+            label = "".join(v for k, v in self._p if k == "label")
+            value = "".join(v for k, v in self._p if k == "text")
+            if label:
+                self.fields[label] = " ".join(value.split())
+            self._p = None
+        elif tag == "form" and self._forms:
+            action, method, fields, is_search = self._forms.pop()
+            if is_search and self.form is None:
+                self.form = (action, method, fields)
+
+    def handle_data(self, data):
+        if self._h3 is not None:
+            self._h3.append(data)
+        if self._strong is not None:
+            self._strong.append(data)
+        elif self._p is not None:
+            self._p.append(("text", data))
+
+def _parse(html: str) -> _AimsParser:
+    p = _AimsParser()
+    try:
+        p.feed(html)
+        p.close()
+    except Exception as e:
+        raise LookupParseError(f"HTML parse failed: {e}")
+    return p
+
+def _ticket_meta(p: _AimsParser):
+    loc  = p.fields.get("Location:")
+    when = p.fields.get("Issue Date and Time:")
+    if not (p.has_ticket_info and loc and when):
+        return None, None
+    return loc, when
+
+_NOT_FOUND = re.compile(r"no\s+ticket(s)?\s+(were\s+)?found", re.I)
+
+class AimsHttpClient:
+    """Ticket lookups over requests; one requests.Session per thread.
+
+    `record_dir`, when set, keeps a copy of every page fetched in the
+    layout aims_replay.py serves back.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 10, record_dir=None):
+        self.base_url   = base_url
+        self.timeout    = timeout
+        self.record_dir = Path(record_dir) if record_dir else None
+        self._local     = threading.local()
+        self._stats     = threading.Lock()
+        self.fetches    = 0
+        self.fetch_s    = 0.0      # total seconds waiting on AIMS responses
+
+    def _http(self) -> requests.Session:
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = requests.Session()
+            s.headers["User-Agent"] = "Mozilla/5.0 (TAPS Tracker)"
+            self._local.session = s
+        return s
+
+    def _fetch(self, method: str, url: str, **kw) -> requests.Response:
+        t0 = time.monotonic()
+        try:
+            r = self._http().request(method, url, timeout=self.timeout, **kw)
+        except requests.RequestException as e:
+            raise LookupParseError(f"{method} {url} failed: {e}")
+        finally:
+            with self._stats:
+                self.fetches += 1
+                self.fetch_s += time.monotonic() - t0
+        if not r.ok:
+            raise LookupParseError(f"{method} {url} → HTTP {r.status_code}")
+        return r
+
+    def _record(self, rel: str, html: str):
+        if not self.record_dir:
+            return
+        path = self.record_dir / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(html, encoding="utf-8")
+
+    def _page(self, p: _AimsParser, page_url: str, tid: str) -> TicketPage:
+        loc, when = _ticket_meta(p)
+        related = {}
+        for lbl, href in p.links:
+            if "#" not in lbl:
+                continue
+            cid = lbl.split("#")[1].strip().upper()
+            if cid == tid:
+                continue
+            if not href or href.startswith("#") or href.lower().startswith("javascript:"):
+                # link is script-driven; we can't follow it without a browser
+                raise LookupParseError(f"related ticket link without an href: {lbl!r}")
+            related.setdefault(cid, urljoin(page_url, href))
+        return TicketPage(tid, loc, when, related)
+
+    def search(self, plate: str, citation: str):
+        """Returns a TicketPage, or None when AIMS says no ticket was found."""
+        tid  = citation.upper()
+        r    = self._fetch("GET", self.base_url)
+        form = _parse(r.text).form
+        if form is None:
+            raise LookupParseError("search form with plate_vin not found")
+        self._record("form.html", r.text)
+        action, method, fields = form
+        fields = dict(fields)
+        fields["plate_vin"]     = plate
+        fields["ticket_number"] = citation
+        url = urljoin(r.url, action or r.url)
+        if method == "post":
+            r = self._fetch("POST", url, data=fields)
+        else:
+            r = self._fetch("GET", url, params=fields)
+        p = _parse(r.text)
+        if not p.has_ticket_info:
+            if _NOT_FOUND.search(r.text):
+                return None
+            raise LookupParseError("no 'Ticket Information' in search result")
+        self._record(f"search/{tid}.html", r.text)
+        page = self._page(p, r.url, tid)
+        if not (page.location and page.issue_date):
+            raise LookupParseError("ticket fields missing from search result")
+        return page
+
+    def ticket(self, citation: str, url: str) -> TicketPage:
+        tid = citation.upper()
+        r = self._fetch("GET", url)
+        p = _parse(r.text)
+        loc, when = _ticket_meta(p)
+        if not (loc and when):
+            raise LookupParseError(f"ticket fields missing from detail page {url}")
+        self._record(f"detail/{tid}.html", r.text)
+        return TicketPage(tid, loc, when)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Local stand-in for ucsc.aimsparking.com/tickets/ that serves recorded pages.
+
+Recordings are what AimsHttpClient(record_dir=…) writes:
+
+    <dir>/form.html            the search form (a minimal one is used if missing)
+    <dir>/search/<TID>.html    result page for a searched citation
+    <dir>/detail/<TID>.html    detail page of a related ticket
+
+Forms are pointed at /tickets/search and every "View ticket #X" link at
+/tickets/detail/X, so both the HTTP engine and Chrome stay on this server.
+Point scraper.py at it with AIMS_BASE_URL=http://127.0.0.1:<port>/tickets/
+
+    python aims_replay.py recordings/ --port 8765
+"""
+import argparse
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote
+
+PREFIX = "/tickets/"
+
+_FORM = """<!doctype html><html><body>
+<form action="search" method="post">
+<input id="plate_vin" name="plate_vin" type="text">
+<input id="ticket_number" name="ticket_number" type="text">
+<button id="search_ticket" type="submit">Search</button>
+</form></body></html>"""
+
+_NOT_FOUND = "<!doctype html><html><body><p>Error: no ticket found.</p></body></html>"
+
+_A_TAG    = re.compile(r"<a\b[^>]*>", re.I)
+_FORM_TAG = re.compile(r"<form\b[^>]*>", re.I)
+_LABEL    = re.compile(r"""aria-label\s*=\s*["'][^"']*View ticket[^"'#]*#\s*([^"']+)["']""", re.I)
+_HREF     = re.compile(r"""\s(href|onclick)\s*=\s*("[^"]*"|'[^']*')""", re.I)
+_ACTION   = re.compile(r"""\s(action|method)\s*=\s*("[^"]*"|'[^']*'|\S+)""", re.I)
+
+def rewrite(html: str) -> str:
+    def a_tag(m):
+        tag = m.group(0)
+        lbl = _LABEL.search(tag)
+        if not lbl:
+            return tag
+        tag = _HREF.sub("", tag)
+        return tag[:-1] + f' href="{PREFIX}detail/{lbl.group(1).strip().upper()}">'
+    def form_tag(m):
+        return _ACTION.sub("", m.group(0))[:-1] + f' action="{PREFIX}search" method="post">'
+    return _FORM_TAG.sub(form_tag, _A_TAG.sub(a_tag, html))
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, root, port: int = 0, latency: float = 0.0):
+        self.root    = Path(root)
+        self.latency = latency       # seconds added to every response
+        self.hits    = 0
+        self._lock   = threading.Lock()
+        super().__init__(("127.0.0.1", port), _Handler)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{PREFIX}"
+
+    def page(self, rel: str):
+        path = self.root / rel
+        return path.read_text("utf-8") if path.is_file() else None
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="aims-replay", daemon=True).start()
+        return self
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, html: str):
+        srv = self.server
+        with srv._lock:
+            srv.hits += 1
+        if srv.latency:
+            time.sleep(srv.latency)
+        body = rewrite(html).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _ticket(self, kind: str, tid: str):
+        html = self.server.page(f"{kind}/{tid.strip().upper()}.html")
+        self._send(200, html or _NOT_FOUND)
+
+    def do_GET(self):
+        path = unquote(self.path.split("?", 1)[0])
+        if path.startswith(PREFIX + "detail/"):
+            return self._ticket("detail", path[len(PREFIX + "detail/"):])
+        if path.startswith(PREFIX + "search"):
+            q = parse_qs(self.path.split("?", 1)[1]) if "?" in self.path else {}
+            return self._ticket("search", (q.get("ticket_number") or [""])[0])
+        if path.rstrip("/") + "/" == PREFIX or path == PREFIX + "index.php":
+            return self._send(200, self.server.page("form.html") or _FORM)
+        self._send(404, "<html><body>not recorded</body></html>")
+
+    def do_POST(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        q = parse_qs(self.rfile.read(n).decode("utf-8", "replace"))
+        self._ticket("search", (q.get("ticket_number") or [""])[0])
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve recorded AIMS ticket pages locally.")
+    ap.add_argument("root", help="directory of recorded pages")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added per response")
+    args = ap.parse_args()
+    srv = ReplayServer(args.root, args.port, args.latency)
+    print(f"Serving {args.root} at {srv.base_url}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Proximity alerts coalesced into one digest per recipient.
+
+add() records a (recipient, citation) match instead of sending right away.
+A worker thread sends each recipient's digest `window` seconds after their
+first pending match, so a burst of tickets around one lot becomes one email.
+A pair that was already alerted is suppressed for `ttl` seconds, e.g. when a
+plate's page is scraped again and lists the same related tickets.
+close() sends whatever is still pending.
+"""
+import threading
+import time
+
+from util import dbg
+
+class AlertDigest:
+    def __init__(self, send, window: float = 120, ttl: float = 12 * 3600):
+        """`send(email, name, matches)` delivers one digest; matches are dicts."""
+        self.send        = send
+        self.window      = window
+        self.ttl         = ttl
+        self.matched     = 0
+        self.suppressed  = 0
+        self.sent        = 0
+        self.failed      = 0
+        self._pending    = {}          # email → [first match at, name, [matches]]
+        self._seen       = {}          # (email, citation) → suppressed until
+        self._cond       = threading.Condition()
+        self._stop       = False
+        self._worker     = threading.Thread(target=self._run, name="alerts", daemon=True)
+        self._worker.start()
+
+    def add(self, email: str, name: str, citation: str, **match) -> bool:
+        """Queue one match for `email`'s next digest; False if it was a repeat."""
+        key = (email.lower(), citation)
+        now = time.monotonic()
+        with self._cond:
+            if self._seen.get(key, 0) > now:
+                self.suppressed += 1
+                return False
+            self._seen[key] = now + self.ttl
+            row = self._pending.setdefault(key[0], [now, name, []])
+            row[2].append(dict(match, citation=citation))
+            self.matched += 1
+            self._cond.notify()
+        return True
+
+    def pending(self) -> int:
+        with self._cond:
+            return sum(len(row[2]) for row in self._pending.values())
+
+    def flush(self, force: bool = False) -> int:
+        """Send the digests whose window has passed (all of them with force); returns how many."""
+        now = time.monotonic()
+        with self._cond:
+            due = [e for e, row in self._pending.items() if force or now - row[0] >= self.window]
+            batch = [(e, *self._pending.pop(e)[1:]) for e in due]
+            # forget suppressed pairs once their ttl is up
+            self._seen = {k: t for k, t in self._seen.items() if t > now}
+        for email, name, matches in batch:
+            try:
+                self.send(email, name, matches)
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                dbg(f"‼ alert digest → {email} failed: {e}")
+        return len(batch)
+
+    def close(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        self._worker.join()
+        self.flush(force=True)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stop:
+                    return
+                if self._pending:
+                    first = min(row[0] for row in self._pending.values())
+                    left  = first + self.window - time.monotonic()
+                else:
+                    left = None
+                if left is None or left > 0:
+                    self._cond.wait(left)
+                    continue
+            self.flush()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Page-load time of the old Chrome options vs the lean session profile.
+
+    python bench_browser.py --loads 20
+    python bench_browser.py --url http://127.0.0.1:8765/tickets/   # aims_replay.py
+"""
+import argparse
+import os
+import statistics
+import time
+
+from browser import BrowserSession
+
+def measure(lean: bool, url: str, loads: int):
+    s = BrowserSession("lean" if lean else "legacy", lean=lean)
+    try:
+        s.get(url)                      # warm-up: DNS, TLS, disk cache
+        s.load_s.clear()
+        for _ in range(loads):
+            s.get(url)
+        return list(s.load_s), s.rss_mb()
+    finally:
+        s.quit()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--url", default=os.getenv("AIMS_BASE_URL", "https://ucsc.aimsparking.com/tickets/"))
+    ap.add_argument("--loads", type=int, default=20)
+    args = ap.parse_args()
+
+    t0 = time.monotonic()
+    results = {name: measure(lean, args.url, args.loads) for name, lean in (("legacy", False), ("lean", True))}
+    print(f"{args.loads} loads of {args.url} per profile ({time.monotonic() - t0:.0f}s total)")
+    for name, (loads, rss) in results.items():
+        mem = f", {rss:.0f} MB" if rss is not None else ""
+        print(f"  {name:6}: mean {statistics.mean(loads) * 1000:7.0f} ms  "
+              f"p50 {statistics.median(loads) * 1000:7.0f} ms{mem}")
+    old, new = statistics.mean(results["legacy"][0]), statistics.mean(results["lean"][0])
+    print(f"  saved : {(old - new) * 1000:7.0f} ms per page ({(1 - new / old) * 100:.0f}%)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Microbenchmark: per-parker haversine loop vs ParkerIndex radius query.
+
+    python bench_parkers.py --parkers 2000 --tickets 500 --radius 10000
+"""
+import argparse
+import random
+import time
+import datetime as dt
+
+import parker_index
+from parker_index import ParkerIndex
+from util import haversine, utc_tz
+
+CAMPUS = (36.9914, -122.0609)
+
+def make_parkers(n, rng):
+    now = dt.datetime.now(utc_tz())
+    return [dict(
+        email    = f"user{i}@ucsc.edu",
+        full     = f"User {i}",
+        loc_name = "Current Location",
+        ts_end   = now + dt.timedelta(hours=rng.uniform(-1, 4)),
+        hours    = 4.0,
+        lat      = CAMPUS[0] + rng.uniform(-0.02, 0.02),
+        lng      = CAMPUS[1] + rng.uniform(-0.02, 0.02),
+    ) for i in range(n)]
+
+def legacy(parkers, tickets, radius_ft):
+    """The loop process()/_process_related() used to run for each ticket."""
+    hits = 0
+    for t_lat, t_lng in tickets:
+        for p in parkers:
+            if dt.datetime.now(utc_tz()) > p["ts_end"]:
+                continue
+            if haversine(t_lat, t_lng, p["lat"], p["lng"]) <= radius_ft:
+                hits += 1
+    return hits
+
+def indexed(index, tickets, radius_ft):
+    now = dt.datetime.now(utc_tz())
+    return sum(len(index.query(t_lat, t_lng, radius_ft, now)) for t_lat, t_lng in tickets)
+
+def bench(fn, *args, repeat=3):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--parkers", type=int, default=2000)
+    ap.add_argument("--tickets", type=int, default=500)
+    ap.add_argument("--radius", type=float, default=10_000, help="feet")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    parkers = make_parkers(args.parkers, rng)
+    tickets = [(CAMPUS[0] + rng.uniform(-0.02, 0.02), CAMPUS[1] + rng.uniform(-0.02, 0.02))
+               for _ in range(args.tickets)]
+
+    t_build, index = bench(ParkerIndex, parkers)
+    t_old, n_old = bench(legacy, parkers, tickets, args.radius)
+    t_new, n_new = bench(indexed, index, tickets, args.radius)
+    print(f"{args.parkers} parkers × {args.tickets} tickets, radius {args.radius:,.0f} ft "
+          f"(numpy {'on' if parker_index.np is not None else 'off'})")
+    print(f"  legacy loop : {t_old * 1000:9.2f} ms  ({n_old} matches)")
+    print(f"  index build : {t_build * 1000:9.2f} ms")
+    print(f"  index query : {t_new * 1000:9.2f} ms  ({n_new} matches)  ×{t_old / max(t_new, 1e-9):.1f}")
+    # boundary rounding can differ in the last float bit; anything more is a bug
+    if abs(n_old - n_new) > max(1, n_old // 10_000):
+        raise SystemExit(f"match counts differ: {n_old} vs {n_new}")
+
+if __name__ == "__main__":
+    main()
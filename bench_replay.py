@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Offline throughput benchmark for scrape_main() against aims_replay.py.
+
+Generates (or reuses) recorded AIMS pages, serves them locally, points
+BASE_URL at the stand-in and runs scrape_main() over a generated main.txt.
+Each pass reports plates/sec, p50/p95 per-plate latency and time spent
+waiting on pages, and the results are written as JSON so runs can be
+diffed:
+
+    python bench_replay.py --plates 200 --related 3 --engine http --workers 4
+    python bench_replay.py --recordings recordings/ --engine selenium --out before.json
+
+Pass 1 starts from an empty ticket store (every ticket is new), pass 2 re-runs
+the same rows with everything already scraped — the steady state.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import datetime as dt
+from pathlib import Path
+
+from aims_replay import ReplayServer
+from util import started
+
+LOTS = ["162 OAKES COLLEGE", "103A EAST FIELD HOUSE", "112 CORE WEST STRUCTURE",
+        "111A CROWN COLLEGE PIT", "119 MERRILL COLLEGE", "EMPIRE GRADE"]
+
+def _ticket_html(loc: str, when: str, related=()):
+    links = "".join(
+        f'<a aria-label="View ticket #{r}" href="index.php?cmd=detail&ticketid={r}">View</a>\n'
+        for r in related
+    )
+    return (
+        "<html><body><h3>Ticket Information</h3>\n"
+        f"<p><strong>Issue Date and Time:</strong> {when}</p>\n"
+        f"<p><strong>Location:</strong> {loc}</p>\n{links}</body></html>\n"
+    )
+
+def make_recordings(root: Path, plates: int, related: int):
+    """Synthetic recordings: `plates` searches, each with `related` detail pages."""
+    (root / "search").mkdir(parents=True, exist_ok=True)
+    (root / "detail").mkdir(parents=True, exist_ok=True)
+    rows = []
+    for i in range(plates):
+        tid = f"25BN{i:06d}"
+        rel = [f"25BR{i:06d}{j}" for j in range(related)]
+        when = f"{(i % 12) + 1}/{(i % 28) + 1}/2025 {(i % 12) + 1}:{i % 60:02d} {'AM' if i % 2 else 'PM'}"
+        (root / "search" / f"{tid}.html").write_text(
+            _ticket_html(LOTS[i % len(LOTS)], when, rel), encoding="utf-8")
+        for j, r in enumerate(rel):
+            (root / "detail" / f"{r}.html").write_text(
+                _ticket_html(LOTS[(i + j + 1) % len(LOTS)], when), encoding="utf-8")
+        rows.append(f"{tid},BENCH{i:03d}")
+    return rows
+
+def rows_from_recordings(root: Path):
+    return [f"{p.stem},REPLAY{i:03d}" for i, p in enumerate(sorted((root / "search").glob("*.html")))]
+
+def _pct(xs, q):
+    if not xs:
+        return None
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(q * (len(xs) - 1))))]
+
+def _chrome_totals(scraper):
+    # with --engine http Chrome may never start; don't launch it just to read zeros
+    if not started(scraper.pool):
+        return {"wait_s": 0.0, "wait_timeouts": 0}
+    return scraper.pool.totals()
+
+def run_pass(scraper, rows, server: ReplayServer):
+    latencies, lock = [], threading.Lock()
+    process = scraper.process
+
+    def timed(plate, citation, session=None):
+        # process() re-enters itself through the module global with a Chrome
+        # session; only the outer call is one plate
+        if session is not None:
+            return process(plate, citation, session)
+        t0 = time.monotonic()
+        try:
+            return process(plate, citation, session)
+        finally:
+            with lock:
+                latencies.append(time.monotonic() - t0)
+
+    scraper.MAIN_PATH.write_text("\n".join(rows) + "\n", encoding="utf-8")
+    chrome0  = _chrome_totals(scraper)
+    fetch0   = scraper.aims.fetch_s
+    hits0    = server.hits
+    scraper.process = timed
+    t0 = time.monotonic()
+    try:
+        scraper.scrape_main()
+    finally:
+        scraper.process = process
+    wall = time.monotonic() - t0
+    chrome = _chrome_totals(scraper)
+    return dict(
+        plates          = len(rows),
+        wall_s          = round(wall, 3),
+        plates_per_s    = round(len(rows) / wall, 3) if wall else None,
+        p50_ms          = round(_pct(latencies, 0.50) * 1000, 1) if latencies else None,
+        p95_ms          = round(_pct(latencies, 0.95) * 1000, 1) if latencies else None,
+        mean_ms         = round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+        webdriver_wait_s = round(chrome["wait_s"] - chrome0["wait_s"], 3),
+        wait_timeouts   = chrome["wait_timeouts"] - chrome0["wait_timeouts"],
+        http_wait_s     = round(scraper.aims.fetch_s - fetch0, 3),
+        requests_served = server.hits - hits0,
+        tickets_stored  = scraper.scraped.count(),
+    )
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay benchmark for scrape_main().")
+    ap.add_argument("--recordings", help="directory of recorded pages (default: generate)")
+    ap.add_argument("--plates", type=int, default=100)
+    ap.add_argument("--related", type=int, default=2, help="related tickets per plate")
+    ap.add_argument("--engine", choices=["http", "selenium"], default="http")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--latency", type=float, default=0.05, help="seconds added per response")
+    ap.add_argument("--passes", type=int, default=2)
+    ap.add_argument("--out", default="bench_replay.json")
+    args = ap.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix="taps-bench-"))
+    if args.recordings:
+        root = Path(args.recordings)
+        rows = rows_from_recordings(root)[:args.plates]
+    else:
+        root = work / "recordings"
+        rows = make_recordings(root, args.plates, args.related)
+    server = ReplayServer(root, latency=args.latency).start()
+
+    os.environ["AIMS_BASE_URL"]  = server.base_url
+    os.environ["LOOKUP_ENGINE"]  = args.engine
+    os.environ["SCRAPE_WORKERS"] = str(args.workers)
+    os.environ["SCRAPE_MODE"]    = "sweep"
+    import scraper
+    from negative_cache import NegativeCache
+    from parker_registry import ParkerRegistry
+    from plate_scheduler import PlateScheduler
+    from ticket_store import TicketStore
+    # keep the benchmark's rows and tickets out of the real data files
+    scraper.MAIN_PATH     = work / "main.txt"
+    scraper.VALIDATE_PATH = work / "validate.txt"
+    scraper.scraped       = TicketStore(work / "tickets.db")
+    scraper.scheduler     = PlateScheduler(work / "plate_state.json")
+    scraper.registry      = ParkerRegistry(work / "parked.txt")
+    scraper.negcache      = NegativeCache(work / "negative_cache.json")
+
+    passes = []
+    try:
+        for i in range(args.passes):
+            r = run_pass(scraper, rows, server)
+            r["pass"] = i + 1
+            passes.append(r)
+            print(f"pass {i + 1}: {r['plates']} plates in {r['wall_s']:.2f}s → "
+                  f"{r['plates_per_s']} plates/s, p50 {r['p50_ms']} ms, p95 {r['p95_ms']} ms, "
+                  f"waits: webdriver {r['webdriver_wait_s']}s / http {r['http_wait_s']}s")
+    finally:
+        server.shutdown()
+
+    result = dict(
+        when      = dt.datetime.now().isoformat(timespec="seconds"),
+        python    = sys.version.split()[0],
+        machine   = platform.platform(),
+        config    = vars(args),
+        passes    = passes,
+    )
+    Path(args.out).write_text(json.dumps(result, indent=1), encoding="utf-8")
+    print(f"Results → {args.out}")
+    scraper.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""Headless Chrome sessions for the AIMS lookups, and the pool that owns them.
+
+Sessions start with a lean profile by default: images, fonts and media are
+blocked, and pages load with the "eager" strategy, so a lookup waits for
+the DOM only, not every subresource. The pool checks each session before
+handing it out and restarts it if Chrome died. It recycles a session after
+`max_pages` navigations, once Chrome's memory passes `max_rss_mb` (needs
+psutil), or after `max_errors` WebDriver errors in a row.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from selenium import webdriver
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+
+from util import dbg
+
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.mp4", "*.webm",
+]
+
+class TimedWait(WebDriverWait):
+    """WebDriverWait that adds the time spent (and timeouts hit) to its session."""
+
+    def __init__(self, session, timeout: float):
+        super().__init__(session.driver, timeout)
+        self._session = session
+
+    def until(self, method, message: str = ""):
+        t0 = time.monotonic()
+        try:
+            return super().until(method, message)
+        except TimeoutException:
+            self._session.wait_timeouts += 1
+            raise
+        finally:
+            self._session.wait_s += time.monotonic() - t0
+
+def chrome_options(lean: bool = True):
+    opts = webdriver.ChromeOptions()
+    opts.add_argument("--headless")
+    opts.add_argument("--disable-gpu")
+    opts.add_argument("--disable-logging")
+    opts.add_argument("--log-level=3")
+    if lean:
+        opts.page_load_strategy = "eager"
+        opts.add_argument("--disable-extensions")
+        opts.add_argument("--disable-background-networking")
+        opts.add_argument("--disable-dev-shm-usage")
+        opts.add_argument("--blink-settings=imagesEnabled=false")
+        opts.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.fonts":  2,
+        })
+    return opts
+
+class BrowserSession:
+    """One headless Chrome plus the wait process() uses, with usage counters."""
+
+    def __init__(self, name: str, lean: bool = True):
+        self.name     = name
+        self.lean     = lean
+        self.restarts = -1
+        self.load_s   = deque(maxlen=2000)   # recent page-load seconds for the pool's report
+        self.wait_s   = 0.0                  # total seconds spent inside wait.until()
+        self.wait_timeouts = 0
+        self._start()
+
+    def _start(self):
+        self.driver = webdriver.Chrome(options=chrome_options(self.lean))
+        self.wait   = TimedWait(self, 6)
+        # bounds the in-page fetch of related tickets in _process_related()
+        self.driver.set_script_timeout(20)
+        if self.lean:
+            try:
+                self.driver.execute_cdp_cmd("Network.enable", {})
+                self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+            except Exception as e:
+                dbg(f"⚠ {self.name}: resource blocking unavailable: {e}")
+        self.pages    = 0
+        self.errors   = 0
+        self.restarts += 1
+
+    # ── usage ─────────────────────────────────────────────────────
+    def get(self, url: str):
+        t0 = time.monotonic()
+        self.driver.get(url)
+        self.load_s.append(time.monotonic() - t0)
+        self.pages += 1
+
+    def note_page(self):
+        """Count a navigation that didn't go through get() (clicks, back())."""
+        self.pages += 1
+
+    def record_ok(self):
+        self.errors = 0
+
+    def record_error(self, e: Exception):
+        """Count errors that point at a broken driver; a wait timing out on an unknown plate doesn't."""
+        if isinstance(e, WebDriverException) and not isinstance(e, (TimeoutException, NoSuchElementException)):
+            self.errors += 1
+
+    def rss_mb(self):
+        """Resident memory of chromedriver and its Chrome processes, if psutil is installed."""
+        if psutil is None:
+            return None
+        try:
+            proc = psutil.Process(self.driver.service.process.pid)
+            return sum(p.memory_info().rss for p in [proc, *proc.children(recursive=True)]) / 2**20
+        except Exception:
+            return None
+
+    def healthy(self) -> bool:
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    # ── lifecycle ─────────────────────────────────────────────────
+    def restart(self, why: str):
+        dbg(f"♻ {self.name}: restarting Chrome ({why})")
+        self.quit()
+        self._start()
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            dbg(f"‼ {self.name}: quit failed: {e}")
+
+class BrowserPool:
+    """Fixed set of sessions handed out one caller at a time."""
+
+    def __init__(self, size: int = 1, lean: bool = True, max_pages: int = 500,
+                 max_rss_mb: float = 1024, max_errors: int = 3):
+        self.size       = max(1, int(size))
+        self.max_pages  = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.max_errors = max_errors
+        self._idle = queue.Queue()
+        self._all  = []
+        self._lock = threading.Lock()
+        for i in range(self.size):
+            dbg(f"Launching headless Chrome #{i + 1}/{self.size}…")
+            s = BrowserSession(f"chrome-{i + 1}", lean=lean)
+            self._all.append(s)
+            self._idle.put(s)
+        dbg(f"Chrome pool ready ✔ ({self.size} session{'s' if self.size != 1 else ''}, "
+            f"{'lean' if lean else 'full'} profile)")
+
+    def _recycle_reason(self, s: BrowserSession):
+        if s.errors >= self.max_errors:
+            return f"{s.errors} WebDriver errors in a row"
+        if s.pages >= self.max_pages:
+            return f"{s.pages} pages loaded"
+        rss = s.rss_mb()
+        if rss is not None and rss >= self.max_rss_mb:
+            return f"{rss:.0f} MB resident"
+        return None
+
+    @contextmanager
+    def session(self):
+        s = self._idle.get()
+        try:
+            if not s.healthy():
+                s.restart("not responding")
+            yield s
+        finally:
+            try:
+                why = self._recycle_reason(s)
+                if why:
+                    s.restart(why)
+            except Exception as e:
+                dbg(f"‼ {s.name}: recycle failed: {e}")
+            self._idle.put(s)
+
+    def report(self) -> str:
+        loads = sorted(t for s in self._all for t in s.load_s)
+        if not loads:
+            return "no pages loaded"
+        mean = sum(loads) / len(loads)
+        return (f"{len(loads)} page loads, mean {mean * 1000:.0f} ms, "
+                f"p50 {loads[len(loads) // 2] * 1000:.0f} ms, "
+                f"{sum(s.restarts for s in self._all)} restart(s)")
+
+    def totals(self) -> dict:
+        """Counters summed over every session, for metrics and benchmarks."""
+        with self._lock:
+            sessions = list(self._all)
+        return dict(
+            pages         = sum(s.pages for s in sessions),
+            restarts      = sum(s.restarts for s in sessions),
+            wait_s        = sum(s.wait_s for s in sessions),
+            wait_timeouts = sum(s.wait_timeouts for s in sessions),
+        )
+
+    def quit(self):
+        with self._lock:
+            for s in self._all:
+                s.quit()
+            self._all.clear()
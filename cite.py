@@ -1,33 +1,166 @@
+#!/usr/bin/env python3
+"""Export the `citations` collection to public/citations.txt, incrementally.
+
+Pages through the collection ordered by `timestamp`, starting after the last
+document exported (cite_cursor.json), and appends only new documents.
+The file is swapped in atomically. If it was changed behind our back (its
+size no longer matches the cursor), or with --full, it is rebuilt from a
+full stream, which also picks up documents without a timestamp.
+
+    python cite.py                      # append what's new
+    python cite.py --full               # rebuild from scratch
+    python cite.py --feed public/citations_feed   # also write month shards + manifest
+
+With FIRESTORE_EMULATOR_HOST set (e.g. localhost:8080), cred.json isn't needed.
+The cursor relies on `timestamp` sorting chronologically (a Firestore timestamp).
+A document written later with an older timestamp is only picked up by --full.
+"""
+import argparse
+import json
+import os
+import re
+import time
+from pathlib import Path
+
 import firebase_admin
 from firebase_admin import credentials, firestore
 
-# Initialize Firebase
-cred = credentials.Certificate('cred.json')
-firebase_admin.initialize_app(cred)
-
-# Firestore client
-db = firestore.client()
-
-# Reference to the 'citations' collection
-citations_ref = db.collection('citations')
-
-# Fetch all documents in the 'citations' collection
-docs = citations_ref.stream()
-
-# Open the citations.txt file in write mode
-with open('public\citations.txt', mode='w', newline='') as file:
-    # Iterate over each document and write its data to the file
-    for doc in docs:
-        citation_data = doc.to_dict()
-        citationNumber = citation_data.get('citationNumber', 'Unavailable')
-        college = citation_data.get('college', 'Unavailable')
-        time = citation_data.get('time', 'Unavailable')
-        timestamp = citation_data.get('timestamp', 'Unavailable')
-        
-        # Format the data in the required string format with quotes and a comma
-        formatted_data = f'"{citationNumber},{college},{time},{timestamp}",\n'
-        
-        # Write the formatted string to the file
-        file.write(formatted_data)
-
-print("Data compilation complete. All data has been written to citations.txt")
+from feed import ShardedFeed
+
+BASE       = Path(__file__).parent
+OUT_TXT    = BASE / "public" / "citations.txt"
+CURSOR     = BASE / "cite_cursor.json"
+COLLECTION = "citations"
+ORDER_BY   = "timestamp"
+PAGE_SIZE  = 500
+
+_RECORD = re.compile(r'"([^"]*)"')
+_MDY    = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})")
+_ISO    = re.compile(r"(\d{4})-(\d{2})-\d{2}")
+
+def init_db():
+    if os.getenv("FIRESTORE_EMULATOR_HOST") and not (BASE / "cred.json").exists():
+        firebase_admin.initialize_app(options={"projectId": os.getenv("GCLOUD_PROJECT", "demo-taps")})
+    else:
+        # Initialize Firebase
+        firebase_admin.initialize_app(credentials.Certificate(str(BASE / "cred.json")))
+    return firestore.client()
+
+def format_line(citation_data: dict) -> str:
+    citationNumber = citation_data.get('citationNumber', 'Unavailable')
+    college = citation_data.get('college', 'Unavailable')
+    clock = citation_data.get('time', 'Unavailable')
+    timestamp = citation_data.get('timestamp', 'Unavailable')
+    # Format the data in the required string format with quotes and a comma
+    return f'"{citationNumber},{college},{clock},{timestamp}",\n'
+
+def _month(line: str) -> str:
+    """YYYY-MM of a citations.txt line, or "unknown"."""
+    rec = _RECORD.search(line)
+    date = rec.group(1).rsplit(",", 1)[-1] if rec else ""
+    m = _MDY.search(date)
+    if m:
+        return f"{int(m.group(3)):04d}-{int(m.group(1)):02d}"
+    m = _ISO.search(date)
+    return f"{m.group(1)}-{m.group(2)}" if m else "unknown"
+
+def load_cursor() -> dict:
+    try:
+        return json.loads(CURSOR.read_text("utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_cursor(cursor: dict):
+    tmp = CURSOR.with_name(CURSOR.name + ".tmp")
+    tmp.write_text(json.dumps(cursor, indent=1), encoding="utf-8")
+    tmp.replace(CURSOR)
+
+def write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+def fetch_new(col, last_id: str = None, page_size: int = PAGE_SIZE):
+    """Docs after `last_id` in timestamp order, one page per query; returns (docs, reads).
+
+    None when the cursor document no longer exists – the caller rebuilds instead.
+    """
+    after = None
+    if last_id:
+        after = col.document(last_id).get()
+        if not after.exists:
+            return None
+    docs, reads = [], 1 if last_id else 0
+    while True:
+        q = col.order_by(ORDER_BY).limit(page_size)
+        if after is not None:
+            q = q.start_after(after)
+        page = list(q.stream())
+        reads += max(1, len(page))
+        docs.extend(page)
+        if len(page) < page_size:
+            return docs, reads
+        after = page[-1]
+
+def write_feed(out_dir: Path, lines, new_lines):
+    """Month shards of citations.txt plus a delta of the newest lines."""
+    feed = ShardedFeed(out_dir, ext="txt")
+    months = {}
+    for ln in lines:
+        months.setdefault(_month(ln), []).append(ln)
+    touched = {_month(ln) for ln in new_lines} if feed.manifest["shards"] else set(months)
+    written = sum(feed.write_shard(m, months[m], len(months[m])) for m in sorted(touched))
+    feed.write_delta([ln.strip() for ln in new_lines[-500:]],
+                     since=len(lines) - len(new_lines[-500:]), cursor=len(lines))
+    feed.commit(len(lines), len(lines))
+    print(f"Feed: {written}/{len(touched)} shard(s) rewritten → {out_dir}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Incremental citations.txt export.")
+    ap.add_argument("--full", action="store_true", help="stream everything and rewrite")
+    ap.add_argument("--out", default=str(OUT_TXT))
+    ap.add_argument("--feed", help="also write the sharded feed layout here")
+    ap.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    args = ap.parse_args()
+
+    t0  = time.monotonic()
+    out = Path(args.out)
+    db  = init_db()
+    # Reference to the 'citations' collection
+    col = db.collection(COLLECTION)
+
+    cursor = load_cursor()
+    full = (args.full or not out.exists() or cursor.get("out") != str(out)
+            or out.stat().st_size != cursor.get("size"))
+    fetched = None if full else fetch_new(col, cursor.get("last_id"), args.page_size)
+    if fetched is None:
+        full  = True
+        docs  = list(col.stream())
+        reads = len(docs)
+        lines, new_lines = [format_line(d.to_dict() or {}) for d in docs], None
+        data  = "".join(lines).encode("utf-8")
+        # the newest timestamped doc is where the next incremental run starts
+        stamped = [d for d in docs if (d.to_dict() or {}).get(ORDER_BY) is not None]
+        last = max(stamped, key=lambda d: (d.to_dict()[ORDER_BY], d.id)) if stamped else None
+    else:
+        docs, reads = fetched
+        new_lines = [format_line(d.to_dict() or {}) for d in docs]
+        data  = out.read_bytes() + "".join(new_lines).encode("utf-8")
+        last  = docs[-1] if docs else None
+    if full or new_lines:
+        write_atomic(out, data)
+    save_cursor(dict(
+        out     = str(out),
+        size    = out.stat().st_size,
+        last_id = last.id if last is not None else cursor.get("last_id"),
+        count   = data.count(b"\n"),
+    ))
+    if args.feed and (new_lines != [] or not (Path(args.feed) / "manifest.json").exists()):
+        lines = data.decode("utf-8").splitlines(keepends=True)
+        write_feed(Path(args.feed), lines, lines if new_lines is None else new_lines)
+
+    print(f"{'Rebuilt' if full else 'Appended'} {len(docs)} citation(s) → {out} "
+          f"({reads} read(s), {time.monotonic() - t0:.1f}s)")
+
+if __name__ == "__main__":
+    main()
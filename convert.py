@@ -1,26 +1,202 @@
+#!/usr/bin/env python3
+"""Incremental image conversion across a process pool.
+
+    python convert.py                       # input_heic/*.HEIC → output_jpg/*.jpg
+    python convert.py publish [DIR ...]     # web variants of the PNG/JPEGs under public/
+    python convert.py publish --widths 480,960 --report convert_report.json
+
+`publish` writes variants next to each image: <name>.webp, plus
+<name>.min.jpg (or .min.png when the image has transparency) re-encoded with
+optimize, and, with --widths, resized <name>-<W>w.webp. The original is never
+modified. An output is skipped when it is newer than its source. It is also
+skipped when convert_manifest.json recorded the same source hash and settings
+for it, e.g. after a fresh checkout reset the mtimes.
+"""
+import argparse
+import hashlib
+import json
 import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from pillow_heif import register_heif_opener
+
 from PIL import Image
 
-# Register HEIC format with Pillow
-register_heif_opener()
+try:
+    from pillow_heif import register_heif_opener
+    # Register HEIC format with Pillow
+    register_heif_opener()
+except ImportError:
+    register_heif_opener = None
+
+BASE     = Path(__file__).parent
+MANIFEST = BASE / "convert_manifest.json"
 
 # Input and output folders
-input_folder = Path("input_heic")
-output_folder = Path("output_jpg")
-output_folder.mkdir(exist_ok=True)
+input_folder  = BASE / "input_heic"
+output_folder = BASE / "output_jpg"
+
+SOURCE_EXT = {".png", ".jpg", ".jpeg"}
+# our own outputs, so a second run doesn't convert its variants again
+_VARIANT = re.compile(r"(\.min|-\d+w)$")
 
-# Convert all .HEIC files in the input folder
-count = 0
-for file in input_folder.glob("*.HEIC"):
+def sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _has_alpha(img) -> bool:
+    return img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+
+def _encode(img, dst: Path, fmt: str, quality: int):
+    tmp = dst.with_name(dst.name + ".tmp")
+    if fmt == "JPEG":
+        img.convert("RGB").save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+    elif fmt == "PNG":
+        img.save(tmp, "PNG", optimize=True)
+    else:
+        img.save(tmp, "WEBP", quality=quality, method=6)
+    tmp.replace(dst)
+
+def plan(src: Path, kind: str, widths=(), out_dir: Path = None):
+    """[(dst, format, width or None)] for one source image."""
+    if kind == "heic":
+        return [((out_dir or output_folder) / (src.stem + ".jpg"), "JPEG", None)]
+    with Image.open(src) as img:
+        alpha = _has_alpha(img)
+        width = img.width
+    outs = [
+        (src.with_name(src.stem + ".webp"), "WEBP", None),
+        (src.with_name(src.stem + (".min.png" if alpha else ".min.jpg")), "PNG" if alpha else "JPEG", None),
+    ]
+    outs += [(src.with_name(f"{src.stem}-{w}w.webp"), "WEBP", w) for w in widths if w < width]
+    return outs
+
+def convert(src: Path, outputs, quality: int) -> dict:
+    """Worker: write every output of one source; returns timing and sizes."""
+    t0  = time.monotonic()
+    res = dict(src=str(src), src_bytes=src.stat().st_size, outputs={}, error=None)
     try:
-        with Image.open(file) as img:
-            output_path = output_folder / (file.stem + ".jpg")
-            img.convert("RGB").save(output_path, "JPEG")
-            print(f"✔ Converted: {file.name} → {output_path.name}")
-            count += 1
+        with Image.open(src) as img:
+            img.load()
+            for dst, fmt, width in outputs:
+                t1 = time.monotonic()
+                im = img
+                if width:
+                    im = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+                _encode(im, Path(dst), fmt, quality)
+                res["outputs"][str(dst)] = dict(bytes=Path(dst).stat().st_size,
+                                                seconds=round(time.monotonic() - t1, 3))
     except Exception as e:
-        print(f"✖ Error converting {file.name}: {e}")
+        res["error"] = f"{type(e).__name__}: {e}"
+    res["seconds"] = round(time.monotonic() - t0, 3)
+    return res
+
+def _load_manifest():
+    try:
+        return json.loads(MANIFEST.read_text("utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _save_manifest(manifest: dict):
+    tmp = MANIFEST.with_name(MANIFEST.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+    tmp.replace(MANIFEST)
+
+def _up_to_date(src: Path, dst: Path, digest, settings: str, manifest: dict) -> bool:
+    if not dst.exists():
+        return False
+    if dst.stat().st_mtime >= src.stat().st_mtime:
+        return True
+    seen = manifest.get(os.path.relpath(dst, BASE))
+    return bool(seen) and seen["settings"] == settings and seen["src_sha256"] == digest()
+
+def sources(kind: str, dirs):
+    if kind == "heic":
+        return sorted(p for p in input_folder.glob("*") if p.suffix.lower() in (".heic", ".heif"))
+    found = []
+    for d in dirs:
+        for p in Path(d).rglob("*"):
+            if (p.is_file() and p.suffix.lower() in SOURCE_EXT and not _VARIANT.search(p.stem)
+                    and not any(part.startswith(".") or part == "node_modules" for part in p.parts)):
+                found.append(p)
+    return sorted(found)
+
+def main():
+    ap = argparse.ArgumentParser(description="Incremental image conversion.")
+    ap.add_argument("kind", nargs="?", choices=["heic", "publish"], default="heic")
+    ap.add_argument("dirs", nargs="*", help="publish: folders to scan (default public/)")
+    ap.add_argument("--widths", default="", help="publish: extra resized WebP widths, e.g. 480,960")
+    ap.add_argument("--quality", type=int, default=82)
+    ap.add_argument("--workers", type=int, default=os.cpu_count())
+    ap.add_argument("--force", action="store_true", help="rebuild even if up to date")
+    ap.add_argument("--report", help="write per-file results as JSON here")
+    args = ap.parse_args()
+
+    if args.kind == "heic":
+        if register_heif_opener is None:
+            sys.exit("✖ pillow-heif is not installed: pip install pillow-heif")
+        output_folder.mkdir(exist_ok=True)
+    widths   = sorted({int(w) for w in args.widths.split(",") if w.strip()})
+    dirs     = args.dirs or [BASE / "public"]
+    manifest = _load_manifest()
+    settings = json.dumps({"quality": args.quality})
+
+    t0, jobs, skipped = time.monotonic(), {}, 0
+    for src in sources(args.kind, dirs):
+        digest_memo = []
+        def digest(src=src, memo=digest_memo):
+            if not memo:
+                memo.append(sha256(src))
+            return memo[0]
+        try:
+            outs = plan(src, args.kind, widths)
+        except Exception as e:
+            print(f"✖ Error reading {src}: {e}")
+            continue
+        todo = [o for o in outs if args.force or not _up_to_date(src, o[0], digest, settings, manifest)]
+        skipped += len(outs) - len(todo)
+        if todo:
+            jobs[src] = (todo, digest)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as ex:
+        futures = {ex.submit(convert, src, todo, args.quality): src for src, (todo, _) in jobs.items()}
+        for fut in as_completed(futures):
+            res = fut.result()
+            results.append(res)
+            src = futures[fut]
+            if res["error"]:
+                print(f"✖ Error converting {src.name}: {res['error']}")
+                continue
+            for dst, out in res["outputs"].items():
+                manifest[os.path.relpath(dst, BASE)] = dict(src_sha256=jobs[src][1](), settings=settings)
+                saved = res["src_bytes"] - out["bytes"]
+                print(f"✔ {src.name} → {Path(dst).name}  {out['seconds'] * 1000:6.0f} ms  "
+                      f"{res['src_bytes'] / 1024:8.1f} → {out['bytes'] / 1024:8.1f} KiB  "
+                      f"({saved / max(res['src_bytes'], 1) * 100:+.0f}% saved)")
+    _save_manifest(manifest)
+
+    done = [r for r in results if not r["error"]]
+    n_out = sum(len(r["outputs"]) for r in done)
+    src_b = sum(r["src_bytes"] for r in done)
+    # bytes saved by the best variant of each image vs its source
+    best_b = sum(min(o["bytes"] for o in r["outputs"].values()) for r in done if r["outputs"])
+    print(f"\nDone in {time.monotonic() - t0:.1f}s: {n_out} written, {skipped} up to date, "
+          f"{len(results) - len(done)} failed.")
+    if done:
+        print(f"Smallest variants: {src_b / 1024:.0f} KiB → {best_b / 1024:.0f} KiB "
+              f"({(src_b - best_b) / 1024:.0f} KiB saved)")
+    if args.report:
+        Path(args.report).write_text(json.dumps(dict(
+            kind=args.kind, written=n_out, skipped=skipped, source_bytes=src_b,
+            best_bytes=best_b, files=results,
+        ), indent=1), encoding="utf-8")
+    return 1 if len(done) < len(results) else 0
 
-print(f"\nDone. {count} images converted.")
+if __name__ == "__main__":
+    sys.exit(main())
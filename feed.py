@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Sharded, precompressed delta feed of published tickets under public/feed/.
+
+    feed/manifest.json              cursor, total, and per-shard name/hash/size
+    feed/shards/<YYYY-MM>-<h>.csv   one month of tickets in scraped.txt line format
+                                    (+ .gz, + .br when brotli is installed)
+    feed/delta.json                 the most recently added rows with their ids
+
+A client keeps the manifest cursor from its last visit. If that cursor is
+at least delta.since, delta.json has everything newer. Otherwise it
+re-downloads only the shards whose hash changed. Shard names carry their
+content hash, so they can be cached forever.
+"""
+import gzip
+import hashlib
+import json
+import datetime as dt
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from ticket_store import scraped_line
+from util import dbg, utc_tz
+
+def write_variants(path: Path, data: bytes) -> dict:
+    """Write `data` plus .gz/.br siblings atomically; returns their sizes."""
+    sizes = {"bytes": len(data)}
+    variants = [(path, data), (path.with_name(path.name + ".gz"), gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        variants.append((path.with_name(path.name + ".br"), brotli.compress(data, quality=11)))
+    for p, blob in variants:
+        tmp = p.with_name(p.name + ".tmp")
+        tmp.write_bytes(blob)
+        tmp.replace(p)
+        if p is not path:
+            sizes[p.suffix.lstrip(".")] = len(blob)
+    return sizes
+
+def _remove_variants(path: Path):
+    for p in (path, path.with_name(path.name + ".gz"), path.with_name(path.name + ".br")):
+        try:
+            p.unlink()
+        except FileNotFoundError:
+            pass
+
+class ShardedFeed:
+    """Manifest + content-addressed shards + delta file in one directory."""
+
+    def __init__(self, out_dir: Path, ext: str = "csv"):
+        self.out_dir  = Path(out_dir)
+        self.ext      = ext
+        self.manifest_path = self.out_dir / "manifest.json"
+        self.manifest = {"version": 1, "cursor": 0, "total": 0, "shards": {}}
+        if self.manifest_path.exists():
+            try:
+                self.manifest = json.loads(self.manifest_path.read_text("utf-8"))
+            except Exception as e:
+                dbg(f"‼ {self.manifest_path} unreadable, rebuilding: {e}")
+
+    def write_shard(self, key: str, lines, count: int):
+        data   = "".join(lines).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        old    = self.manifest["shards"].get(key)
+        if old and old["sha256"] == digest and (self.out_dir / old["file"]).exists():
+            return False
+        rel = f"shards/{key}-{digest[:12]}.{self.ext}"
+        (self.out_dir / "shards").mkdir(parents=True, exist_ok=True)
+        sizes = write_variants(self.out_dir / rel, data)
+        if old and old["file"] != rel:
+            _remove_variants(self.out_dir / old["file"])
+        self.manifest["shards"][key] = dict(file=rel, sha256=digest, count=count, **sizes)
+        return True
+
+    def write_delta(self, rows, since: int, cursor: int):
+        data = json.dumps(
+            {"since": since, "cursor": cursor, "rows": rows}, separators=(",", ":")
+        ).encode("utf-8")
+        sizes = write_variants(self.out_dir / "delta.json", data)
+        self.manifest["delta"] = dict(
+            file="delta.json", since=since, cursor=cursor,
+            sha256=hashlib.sha256(data).hexdigest(), **sizes,
+        )
+
+    def commit(self, cursor: int, total: int):
+        self.manifest["cursor"]    = cursor
+        self.manifest["total"]     = total
+        self.manifest["generated"] = dt.datetime.now(utc_tz()).isoformat(timespec="seconds")
+        self.manifest["shards"]    = dict(sorted(self.manifest["shards"].items()))
+        data = json.dumps(self.manifest, indent=1).encode("utf-8")
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(self.manifest_path)
+
+class TicketFeed:
+    """Keeps public/feed/ in step with the TicketStore, one month per shard."""
+
+    def __init__(self, store, out_dir: Path, delta_rows: int = 500):
+        self.store      = store
+        self.feed       = ShardedFeed(out_dir)
+        self.delta_rows = delta_rows
+
+    def update(self) -> int:
+        """Rebuild shards for months that gained tickets; returns rows added."""
+        last = int(self.store.get_meta("feed_id", 0))
+        if not self.feed.manifest_path.exists():
+            last = 0
+        new = self.store.since(last)
+        if not new:
+            return 0
+        months = sorted({r[4][:7] for r in new})
+        written = 0
+        for ym in months:
+            rows = self.store.month(ym)
+            written += self.feed.write_shard(ym, (scraped_line(*r[1:]) for r in rows), len(rows))
+        cursor = new[-1][0]
+        recent = self.store.latest(self.delta_rows)
+        self.feed.write_delta(
+            [[r[0], r[1], r[2], r[3], r[4]] for r in recent],
+            since  = recent[0][0] - 1 if recent else cursor,
+            cursor = cursor,
+        )
+        self.feed.commit(cursor, self.store.count())
+        self.store.set_meta("feed_id", cursor)
+        dbg(f"Feed: {len(new)} new ticket(s), {written}/{len(months)} shard(s) rewritten, cursor {cursor}")
+        return len(new)
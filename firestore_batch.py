@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Collect Firestore writes from a sweep and commit them in bulk.
+
+Queue set/update/delete calls with a tag, then commit() once. Each tag gets
+its own (ok, error) result, so one bad document doesn't sink the rest.
+BulkWriter is used when the client has it (it batches and parallelises,
+and a failed write is retried up to BULK_ATTEMPTS times). Otherwise writes
+go out in WriteBatch chunks of 500, and a chunk that fails is retried one
+document at a time to find the bad write.
+
+Setting FIRESTORE_EMULATOR_HOST=localhost:8080 sends all of it to the
+local emulator.
+"""
+import threading
+
+from util import dbg
+
+BATCH_LIMIT   = 500   # Firestore's per-commit write cap
+BULK_ATTEMPTS = 5     # tries per write before BulkWriter gives up on it
+
+class WriteBatcher:
+    def __init__(self, db, label: str = "writes"):
+        self.db    = db
+        self.label = label
+        self._ops  = []   # (tag, kind, ref, data, merge)
+
+    def __len__(self):
+        return len(self._ops)
+
+    def set(self, ref, data: dict, merge: bool = False, tag=None):
+        self._ops.append((tag if tag is not None else ref.path, "set", ref, data, merge))
+
+    def update(self, ref, data: dict, tag=None):
+        self._ops.append((tag if tag is not None else ref.path, "update", ref, data, False))
+
+    def delete(self, ref, tag=None):
+        self._ops.append((tag if tag is not None else ref.path, "delete", ref, None, False))
+
+    @staticmethod
+    def _apply(target, kind, ref, data, merge):
+        if kind == "set":
+            target.set(ref, data, merge=merge)
+        elif kind == "update":
+            target.update(ref, data)
+        else:
+            target.delete(ref)
+
+    def commit(self) -> dict:
+        """{tag: (ok, error)} for every queued write; clears the queue."""
+        ops, self._ops = self._ops, []
+        if not ops:
+            return {}
+        if hasattr(self.db, "bulk_writer"):
+            results = self._commit_bulk(ops)
+        else:
+            results = self._commit_batches(ops)
+        failed = sum(1 for ok, _ in results.values() if not ok)
+        dbg(f"Committed {len(ops)} {self.label} ({failed} failed)")
+        return results
+
+    def _commit_bulk(self, ops) -> dict:
+        by_path = {}
+        for op in ops:
+            by_path.setdefault(op[2].path, []).append(op[0])
+        results = {tag: (True, None) for tag, *_ in ops}
+        lock = threading.Lock()
+
+        def on_error(failure, _writer):
+            # True asks BulkWriter to retry (with its own backoff); only a final
+            # failure marks the tag, so a write that lands on retry stays ok
+            if getattr(failure, "attempts", BULK_ATTEMPTS) < BULK_ATTEMPTS:
+                return True
+            ref = getattr(getattr(failure, "operation", None), "reference", None)
+            with lock:
+                for tag in by_path.get(getattr(ref, "path", None), ()):
+                    results[tag] = (False, failure)
+            return False
+
+        writer = self.db.bulk_writer()
+        writer.on_write_error(on_error)
+        for tag, kind, ref, data, merge in ops:
+            try:
+                self._apply(writer, kind, ref, data, merge)
+            except Exception as e:
+                results[tag] = (False, e)
+        writer.close()
+        return results
+
+    def _commit_batches(self, ops) -> dict:
+        results = {}
+        for i in range(0, len(ops), BATCH_LIMIT):
+            chunk = ops[i:i + BATCH_LIMIT]
+            batch = self.db.batch()
+            try:
+                for _, kind, ref, data, merge in chunk:
+                    self._apply(batch, kind, ref, data, merge)
+                batch.commit()
+                results.update({tag: (True, None) for tag, *_ in chunk})
+                continue
+            except Exception as e:
+                dbg(f"‼ batch of {len(chunk)} {self.label} failed ({e}) – retrying one by one")
+            for tag, kind, ref, data, merge in chunk:
+                try:
+                    single = self.db.batch()
+                    self._apply(single, kind, ref, data, merge)
+                    single.commit()
+                    results[tag] = (True, None)
+                except Exception as e:
+                    results[tag] = (False, e)
+        return results
@@ -1,65 +1,219 @@
-import csv, json, os, sys, time
+#!/usr/bin/env python3
+"""Geocode lot names with the Places API, caching every answer on disk.
+
+Only names missing from geocode_cache.json (keyed by the normalized query)
+are sent. Requests run on a few threads under a shared token bucket and are
+retried with exponential backoff on network errors, HTTP 429/5xx and
+OVER_QUERY_LIMIT. "Not found" answers are cached too; --retry-missing asks again.
+
+    python geocode.py                                   # ucsclots.csv → ucsclots_google.json
+    python geocode.py lots.csv --location-txt location.txt
+    GEOCODE_URL=http://127.0.0.1:8000/find python geocode.py   # stub endpoint, no key needed
+
+The input CSV needs a `name` column. An optional `query` column is the text to
+search for when it differs from the name written out.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
 import requests
-from urllib.parse import quote_plus
-
-API_KEY = os.getenv("GOOGLE_API_KEY")
-if not API_KEY:
-    sys.exit("⚠️  Set GOOGLE_API_KEY in your shell first.")
-
-IN_CSV  = "ucsclots.csv"
-OUT_JSON = "ucsclots_google.json"
-OUT_CSV  = "not_found.csv"
-
-SEARCH_URL = "https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
-
-def search_place(name, campus_hint="uc santa cruz ca"):
-    """Return (lat,lng) or None."""
-    query = f"{name}, {campus_hint}"
-    params = {
-        "input": query,
-        "inputtype": "textquery",
-        "fields": "geometry/location",
-        "key": API_KEY,
-    }
-    r = requests.get(SEARCH_URL, params=params, timeout=10)
-    if not r.ok:
-        return None
-    data = r.json()
-    if data.get("candidates"):
-        loc = data["candidates"][0]["geometry"]["location"]
-        return float(loc["lat"]), float(loc["lng"])
-    return None
 
+from locations import load_location_txt, normalize
+from util import TokenBucket
 
-def main():
-    names = []
-    with open(IN_CSV, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            names.append(row["name"])
-
-    results, missing = [], []
-    for i, name in enumerate(names, 1):
-        loc = search_place(name)
+SEARCH_URL  = os.getenv("GEOCODE_URL", "https://maps.googleapis.com/maps/api/place/findplacefromtext/json")
+API_KEY     = os.getenv("GOOGLE_API_KEY")
+CAMPUS_HINT = "uc santa cruz ca"
+
+IN_CSV     = "ucsclots.csv"
+OUT_JSON   = "ucsclots_google.json"
+OUT_CSV    = "not_found.csv"
+CACHE_JSON = "geocode_cache.json"
+
+# Places statuses worth another try; anything else unexpected is fatal
+_RETRY_STATUS = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+class GeocodeError(Exception):
+    pass
+
+class Geocoder:
+    def __init__(self, cache_path: Path, url: str = SEARCH_URL, key: str = API_KEY,
+                 rate: float = 10, workers: int = 4, attempts: int = 5, backoff: float = 1.0,
+                 hint: str = CAMPUS_HINT):
+        self.cache_path = Path(cache_path)
+        self.url      = url
+        self.key      = key
+        self.bucket   = TokenBucket(rate)
+        self.workers  = workers
+        self.attempts = attempts
+        self.backoff  = backoff
+        self.hint     = hint
+        self.requests = 0
+        self.cache    = {}
+        self._lock    = threading.Lock()
+        self._dirty   = 0
+        self._http    = requests.Session()
+        self._http.mount("http://",  requests.adapters.HTTPAdapter(pool_maxsize=workers))
+        self._http.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=workers))
+        if self.cache_path.exists():
+            try:
+                self.cache = json.loads(self.cache_path.read_text("utf-8"))
+            except Exception as e:
+                print(f"⚠️  {self.cache_path} unreadable, starting fresh: {e}")
+
+    def query_for(self, text: str) -> str:
+        return normalize(f"{text}, {self.hint}" if self.hint else text)
+
+    def save(self):
+        with self._lock:
+            data, self._dirty = json.dumps(self.cache, indent=1, sort_keys=True), 0
+        tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        tmp.replace(self.cache_path)
+
+    def _search(self, query: str):
+        """(lat, lng) or None; raises GeocodeError when retries run out."""
+        params = {"input": query, "inputtype": "textquery", "fields": "geometry/location"}
+        if self.key:
+            params["key"] = self.key
+        for attempt in range(1, self.attempts + 1):
+            self.bucket.wait()
+            self.requests += 1
+            why = None
+            try:
+                r = self._http.get(self.url, params=params, timeout=10)
+                if r.status_code == 429 or r.status_code >= 500:
+                    why = f"HTTP {r.status_code}"
+                elif not r.ok:
+                    raise GeocodeError(f"HTTP {r.status_code} for {query!r}")
+                else:
+                    data   = r.json()
+                    status = data.get("status", "OK")
+                    if data.get("candidates"):
+                        try:
+                            loc = data["candidates"][0]["geometry"]["location"]
+                            return float(loc["lat"]), float(loc["lng"])
+                        except (KeyError, TypeError, IndexError) as e:
+                            raise GeocodeError(f"malformed candidate for {query!r}: {e!r}")
+                    if status in ("OK", "ZERO_RESULTS"):
+                        return None
+                    if status not in _RETRY_STATUS:
+                        raise GeocodeError(f"{status}: {data.get('error_message', '')}".strip())
+                    why = status
+            except (requests.RequestException, ValueError) as e:
+                why = str(e)
+            if attempt < self.attempts:
+                time.sleep(self.backoff * 2 ** (attempt - 1) * (1 + random.random()))
+        raise GeocodeError(f"{query!r} failed after {self.attempts} attempts: {why}")
+
+    def _resolve(self, query: str):
+        loc = self._search(query)
+        with self._lock:
+            self.cache[query] = {"lat": loc[0], "lng": loc[1]} if loc else {"missing": True}
+            self._dirty += 1
+            flush = self._dirty >= 25
+        # a crash mid-run keeps everything resolved so far
+        if flush:
+            self.save()
+        return loc
+
+    def geocode(self, items, retry_missing: bool = False):
+        """[(name, query text)] → ({name: (lat, lng) or None}, errors)."""
+        queries = {name: self.query_for(text) for name, text in items}
+        todo = sorted({
+            q for q in queries.values()
+            if q not in self.cache or (retry_missing and self.cache[q].get("missing"))
+        })
+        print(f"{len(queries)} name(s): {len(queries) - len(todo)} cached, {len(todo)} to look up")
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="geocode") as ex:
+            futures = {ex.submit(self._resolve, q): q for q in todo}
+            for i, fut in enumerate(as_completed(futures), 1):
+                q = futures[fut]
+                try:
+                    loc = fut.result()
+                    print(f"{i}/{len(todo)} {'✔' if loc else '✖'} {q}"
+                          + (f"  →  {loc[0]:.6f}, {loc[1]:.6f}" if loc else " (not found)"))
+                except GeocodeError as e:
+                    errors[q] = str(e)
+                    print(f"{i}/{len(todo)} ‼ {e}")
+        self.save()
+        out = {}
+        for name, q in queries.items():
+            hit = self.cache.get(q)
+            out[name] = (hit["lat"], hit["lng"]) if hit and not hit.get("missing") else None
+        return out, errors
+
+def read_names(path: Path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["name"], row.get("query") or row["name"]) for row in csv.DictReader(f)]
+
+def write_location_txt(path: Path, coords: dict):
+    """Merge into location.txt (the format locations.load_location_txt reads).
+
+    Existing rows keep their place (the lot index prefers earlier rows); new names go at the end.
+    """
+    path = Path(path)
+    rows = load_location_txt(path) if path.exists() else {}
+    for name, loc in coords.items():
         if loc:
-            lat, lng = loc
-            results.append(dict(name=name, lat=lat, lng=lng))
-            print(f"{i}/{len(names)} ✔ {name}  →  {lat:.6f}, {lng:.6f}")
-        else:
-            print(f"{i}/{len(names)} ✖ {name} (not found)")
-            missing.append(name)
-        time.sleep(0.1)          # 10 req/s keeps you well inside quota
+            rows[name.upper()] = loc
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text("".join(
+        f'{{ name: {json.dumps(name)}, lat: {lat}, lng: {lng} }},\n'
+        for name, (lat, lng) in rows.items()
+    ), encoding="utf-8")
+    tmp.replace(path)
+    return len(rows)
 
-    # save outputs
-    with open(OUT_JSON, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2)
-    print(f"\n✅  Saved {len(results)} records to {OUT_JSON}")
+def main():
+    ap = argparse.ArgumentParser(description="Geocode lot names with a persistent cache.")
+    ap.add_argument("csv", nargs="?", default=IN_CSV)
+    ap.add_argument("--json", default=OUT_JSON, help="list of {name, lat, lng} ('' to skip)")
+    ap.add_argument("--location-txt", help="also merge results into this location.txt")
+    ap.add_argument("--not-found", default=OUT_CSV)
+    ap.add_argument("--cache", default=CACHE_JSON)
+    ap.add_argument("--hint", default=CAMPUS_HINT, help="appended to every query")
+    ap.add_argument("--rate", type=float, default=10, help="requests per second")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--retry-missing", action="store_true", help="look up cached misses again")
+    args = ap.parse_args()
+
+    if not API_KEY and "GEOCODE_URL" not in os.environ:
+        sys.exit("⚠️  Set GOOGLE_API_KEY in your shell first.")
+
+    names = read_names(Path(args.csv))
+    geo = Geocoder(args.cache, rate=args.rate, workers=args.workers, hint=args.hint)
+    t0 = time.monotonic()
+    coords, errors = geo.geocode(names, retry_missing=args.retry_missing)
+    found   = [dict(name=n, lat=c[0], lng=c[1]) for n, c in coords.items() if c]
+    missing = [n for n, c in coords.items() if not c]
+    print(f"\n{geo.requests} request(s) in {time.monotonic() - t0:.1f}s")
 
+    # save outputs
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(found, f, indent=2)
+        print(f"✅  Saved {len(found)} records to {args.json}")
+    if args.location_txt:
+        total = write_location_txt(args.location_txt, coords)
+        print(f"✅  {args.location_txt} now has {total} location(s)")
     if missing:
-        with open(OUT_CSV, "w", encoding="utf-8", newline="") as f:
+        with open(args.not_found, "w", encoding="utf-8", newline="") as f:
             w = csv.writer(f); w.writerow(["name"]); w.writerows([[m] for m in missing])
-        print(f"⚠️  {len(missing)} names not found → {OUT_CSV}")
-
+        print(f"⚠️  {len(missing)} names not found → {args.not_found}")
+    if errors:
+        print(f"‼  {len(errors)} name(s) failed and were not cached; run again to retry")
+        return 1
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
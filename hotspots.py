@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Enforcement hotspots: ticket counts by lot × hour of the week.
+
+Every ticket in the TicketStore (plus any extra scraped.txt-format files, e.g.
+citations2.txt) is resolved to a lot through the location resolver and
+counted into a NumPy grid of lots × 168 slots (slot = weekday * 24 + hour,
+Monday 00:00 first, campus local time as printed on the ticket).
+
+public/hotspots.json is both the published aggregate and the saved state:
+
+    lots        [{name, lat, lng, total}], name = first location string seen
+    counts      lots × 168 grid, the heatmap
+    by_slot     168 totals across all lots
+    top         per slot, the most likely lots as [lot index, share of the slot]
+    cursor      last TicketStore id counted; sources: bytes read from each extra file
+
+update() only counts tickets stored after `cursor` and lines appended to the
+extra files, so a cycle costs the new tickets, not the history. Tickets whose
+location doesn't resolve only show up in `unresolved`. After the location tables
+are fixed, `python hotspots.py --full` recounts them.
+"""
+import argparse
+import datetime as dt
+import json
+import re
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from feed import write_variants
+from locations import normalize
+from util import dbg, utc_tz
+
+SLOTS    = 7 * 24
+_RECORD  = re.compile(r'"([^"]*)"')
+_VERSION = 1
+
+def slot(clock: str, issue_date: str) -> int:
+    """Hour-of-week for an HHMM clock and a YYYY-MM-DD date."""
+    y, m, d = (int(x) for x in issue_date.split("-"))
+    return dt.date(y, m, d).weekday() * 24 + min(int(clock[:-2] or 0), 23)
+
+class HotspotAggregator:
+    def __init__(self, store, resolve, out_path: Path, extra=(), top_n: int = 5):
+        self.store    = store
+        self.resolve  = resolve
+        self.out_path = Path(out_path)
+        self.extra    = [Path(p) for p in extra]
+        self.top_n    = top_n
+        self._loaded  = False
+        self._reset()
+
+    def _reset(self):
+        self.lots       = []        # [name, lat, lng]
+        self._lot_ix    = {}        # rounded (lat, lng) → row in counts
+        self.counts     = np.zeros((0, SLOTS), dtype=np.int32) if np is not None else None
+        self.cursor     = 0
+        self.sources    = {}        # extra file → bytes already counted
+        self.unresolved = 0
+
+    # ── state ─────────────────────────────────────────────────────
+    def load(self):
+        self._loaded = True
+        try:
+            data = json.loads(self.out_path.read_text("utf-8"))
+        except (FileNotFoundError, ValueError):
+            return False
+        if data.get("version") != _VERSION:
+            return False
+        self.lots    = [[l["name"], l["lat"], l["lng"]] for l in data["lots"]]
+        self._lot_ix = {(round(l[1], 5), round(l[2], 5)): i for i, l in enumerate(self.lots)}
+        self.counts  = np.asarray(data["counts"], dtype=np.int32).reshape(len(self.lots), SLOTS)
+        self.cursor  = data["cursor"]
+        self.sources = data["sources"]
+        self.unresolved = data["unresolved"]
+        return True
+
+    def _lot(self, loc: str):
+        coords = self.resolve(loc)
+        if not coords:
+            return None
+        key = (round(coords[0], 5), round(coords[1], 5))
+        i = self._lot_ix.get(key)
+        if i is None:
+            i = self._lot_ix[key] = len(self.lots)
+            self.lots.append([normalize(loc), coords[0], coords[1]])
+        return i
+
+    def _count(self, rows):
+        """rows: (location, HHMM, YYYY-MM-DD); adds them to the grid."""
+        lots, slots = [], []
+        for loc, clock, issue_date in rows:
+            try:
+                s = slot(clock, issue_date)
+            except ValueError:
+                self.unresolved += 1
+                continue
+            i = self._lot(loc)
+            if i is None:
+                self.unresolved += 1
+                continue
+            lots.append(i)
+            slots.append(s)
+        if len(self.lots) > len(self.counts):
+            self.counts = np.vstack([
+                self.counts, np.zeros((len(self.lots) - len(self.counts), SLOTS), dtype=np.int32)
+            ])
+        np.add.at(self.counts, (np.asarray(lots, dtype=np.intp), np.asarray(slots, dtype=np.intp)), 1)
+        return len(lots)
+
+    def _read_extra(self, path: Path):
+        """Lines appended to `path` since the last update, as (location, clock, date)."""
+        done = self.sources.get(path.name, 0)
+        if not path.exists():
+            return []
+        size = path.stat().st_size
+        if size < done:
+            raise ValueError(f"{path.name} shrank")
+        with path.open("rb") as f:
+            f.seek(done)
+            data = f.read(size - done)
+        # an unfinished last line is left for the next update
+        data = data[:data.rfind(b"\n") + 1]
+        self.sources[path.name] = done + len(data)
+        rows = []
+        for rec in _RECORD.findall(data.decode("utf-8", "replace")):
+            parts = [p.strip() for p in rec.split(",")]
+            if len(parts) != 4:
+                continue
+            cid, loc, clock, date = parts
+            # the same citation in tickets.db is counted from there
+            if cid.upper() in self.store:
+                continue
+            try:
+                m, d, y = map(int, date.split("/"))
+            except ValueError:
+                continue
+            rows.append((loc, clock, f"{y:04d}-{m:02d}-{d:02d}"))
+        return rows
+
+    # ── public ────────────────────────────────────────────────────
+    def update(self, full: bool = False) -> int:
+        """Count what's new and rewrite hotspots.json if anything was; returns tickets counted."""
+        if np is None:
+            dbg("‼ numpy is not installed – hotspots.json not updated")
+            return 0
+        if full:
+            self._reset()
+        elif not self._loaded and not self.load():
+            full = True
+        try:
+            extra = [r for p in self.extra for r in self._read_extra(p)]
+        except ValueError as e:
+            dbg(f"Hotspots: {e} – recounting everything")
+            self._reset()
+            full, extra = True, [r for p in self.extra for r in self._read_extra(p)]
+        new = self.store.since(self.cursor)
+        n = self._count([(r[2], r[3], r[4]) for r in new] + extra)
+        if new:
+            self.cursor = new[-1][0]
+        if n or full or not self.out_path.exists():
+            self.write()
+            dbg(f"Hotspots: {n} ticket(s) counted, {len(self.lots)} lot(s), "
+                f"{int(self.counts.sum())} total → {self.out_path.name}")
+        return n
+
+    def top(self):
+        """Per slot, the top_n lots by count: [[lot index, share], ...]."""
+        out = []
+        per_slot = self.counts.sum(axis=0)
+        order = np.argsort(-self.counts, axis=0, kind="stable")[:self.top_n]
+        for s in range(SLOTS):
+            total = int(per_slot[s])
+            out.append([
+                [int(i), round(int(self.counts[i, s]) / total, 3)]
+                for i in order[:, s] if self.counts[i, s]
+            ] if total else [])
+        return out
+
+    def write(self):
+        totals = self.counts.sum(axis=1)
+        data = dict(
+            version    = _VERSION,
+            generated  = dt.datetime.now(utc_tz()).isoformat(timespec="seconds"),
+            slots      = "weekday * 24 + hour, Monday 00:00 first",
+            lots       = [dict(name=n, lat=lat, lng=lng, total=int(t))
+                          for (n, lat, lng), t in zip(self.lots, totals)],
+            counts     = self.counts.tolist(),
+            by_slot    = self.counts.sum(axis=0).tolist(),
+            top        = self.top(),
+            total      = int(totals.sum()),
+            unresolved = self.unresolved,
+            cursor     = self.cursor,
+            sources    = self.sources,
+        )
+        self.out_path.parent.mkdir(parents=True, exist_ok=True)
+        write_variants(self.out_path, json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+def main():
+    from locations import LocationResolver
+    from ticket_store import TicketStore
+
+    base = Path(__file__).parent
+    ap = argparse.ArgumentParser(description="Update public/hotspots.json from tickets.db.")
+    ap.add_argument("--full", action="store_true", help="recount every ticket")
+    ap.add_argument("--db", default=str(base / "tickets.db"))
+    ap.add_argument("--out", default=str(base / "public" / "hotspots.json"))
+    ap.add_argument("--extra", nargs="*", default=[str(base / "citations2.txt")],
+                    help="scraped.txt-format files counted alongside tickets.db")
+    args = ap.parse_args()
+
+    store    = TicketStore(args.db)
+    resolver = LocationResolver.from_files(base / "location.txt", base / "ucsclots_google.json",
+                                           base / "ucsclotz.csv")
+    agg = HotspotAggregator(store, resolver.resolve, args.out, extra=args.extra)
+    agg.update(full=args.full)
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Snapshot listeners that replace full .stream() polling of a collection.
+
+A CollectionWatch keeps the latest snapshot of every document in the
+collection, fed by Firestore's on_snapshot. It also remembers which ids
+changed since the last drain(), so a sweep only handles the deltas, and it
+sets `changed` to wake the main loop as soon as something arrives.
+"""
+import threading
+
+from util import dbg
+
+class CollectionWatch:
+    def __init__(self, db, col: str, changed: threading.Event = None):
+        self.col      = col
+        self.changed  = changed or threading.Event()
+        self.ready    = threading.Event()   # set once the initial snapshot arrived
+        self._docs    = {}                  # id → DocumentSnapshot
+        self._dirty   = set()               # ids added/modified since drain()
+        self._removed = set()               # ids removed since drain()
+        self.reads    = 0                   # docs Firestore delivered (and billed) to the listener
+        self._lock    = threading.Lock()
+        self._watch   = db.collection(col).on_snapshot(self._on_snapshot)
+        dbg(f"Listening to {col} ✔")
+
+    def _on_snapshot(self, _col_snapshot, changes, _read_time):
+        with self._lock:
+            for ch in changes:
+                doc = ch.document
+                if ch.type.name == "REMOVED":
+                    self._docs.pop(doc.id, None)
+                    self._dirty.discard(doc.id)
+                    self._removed.add(doc.id)
+                else:
+                    self.reads += 1
+                    self._docs[doc.id] = doc
+                    self._dirty.add(doc.id)
+                    self._removed.discard(doc.id)
+        self.ready.set()
+        if changes:
+            self.changed.set()
+
+    def wait_ready(self, timeout: float = 30) -> bool:
+        return self.ready.wait(timeout)
+
+    def drain(self, full: bool = False):
+        """(changed docs, removed ids) since the last drain; every cached doc if `full`."""
+        with self._lock:
+            ids = set(self._docs) if full else self._dirty
+            docs = [self._docs[i] for i in ids if i in self._docs]
+            removed = self._removed
+            self._dirty, self._removed = set(), set()
+        return docs, removed
+
+    def close(self):
+        try:
+            self._watch.unsubscribe()
+        except Exception as e:
+            dbg(f"‼ {self.col}: unsubscribe failed: {e}")
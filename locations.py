@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Location string → (lat, lng) resolution, built once at startup.
+
+Lookup order for a ticket/parker location:
+  1. exact name from location.txt
+  2. alias: named places from ucsclots_google.json and ucsclotz.csv names
+  3. lot number ("162 …", "LOT 127", "15169") against a sorted index of lot
+     ids, location.txt first, then the Google "Parking Lot N" table, then
+     again without a trailing letter ("111B" → "111")
+
+Results (hits and misses) are memoised in a bounded LRU, and every miss is
+counted so the tables can be fixed from unresolved_locations.txt.
+"""
+import bisect
+import csv
+import json
+import re
+import threading
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+from util import dbg
+
+_LOT      = re.compile(r"\s*(?:PARKING\s+)?(?:LOT\s+)?(\d+\w*)")
+_GOOGLE   = re.compile(r"PARKING LOT (\d+\w*)\b")
+_SUFFIX   = re.compile(r"^(\d+)[A-Z]+$")
+
+def normalize(loc: str) -> str:
+    return " ".join(loc.upper().split())
+
+def load_location_txt(path: Path) -> dict:
+    with Path(path).open(encoding="utf-8") as f:
+        txt = re.sub(r"(\bname\b|\blat\b|\blng\b)\s*:", r'"\1":', f.read().strip())
+    return {
+        r["name"].upper(): (r["lat"], r["lng"])
+        for r in json.loads("[" + txt.rstrip(",") + "]")
+    }
+
+class _LotIndex:
+    """Sorted lot ids; prefix lookups return the earliest-loaded match."""
+
+    def __init__(self):
+        self._rows = {}      # lot id → (order, coords); first one loaded wins
+
+    def add(self, lot: str, coords):
+        self._rows.setdefault(lot, (len(self._rows), coords))
+
+    def freeze(self):
+        self.keys = sorted(self._rows)
+
+    def __contains__(self, lot):
+        return lot in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, lot):
+        row = self._rows.get(lot)
+        return row[1] if row else None
+
+    def prefix(self, prefix: str):
+        i, best = bisect.bisect_left(self.keys, prefix), None
+        while i < len(self.keys) and self.keys[i].startswith(prefix):
+            row = self._rows[self.keys[i]]
+            if best is None or row[0] < best[0]:
+                best = row
+            i += 1
+        return best[1] if best else None
+
+class LocationResolver:
+    def __init__(self, location_data: dict, google=(), lot_names=(), memo_size: int = 4096):
+        self.location_data = location_data
+        self.aliases   = {}
+        self.lots      = _LotIndex()     # from location.txt
+        self.fallback  = _LotIndex()     # from ucsclots_google.json
+        self.memo_size = memo_size
+        self._memo     = OrderedDict()
+        self._misses   = Counter()
+        self._lock     = threading.Lock()
+
+        self.exact = {normalize(k): v for k, v in location_data.items()}
+        for name, coords in location_data.items():
+            m = re.match(r"(\d+\w*)", name)
+            if m:
+                self.lots.add(m.group(1), coords)
+        for row in google:
+            name   = normalize(row["name"])
+            coords = (row["lat"], row["lng"])
+            m = _GOOGLE.match(name)
+            if m:
+                self.fallback.add(m.group(1), coords)
+            elif name not in self.exact:
+                self.aliases[name] = coords
+        self.lots.freeze()
+        self.fallback.freeze()
+        # ucsclotz.csv has the official lot names without coordinates
+        for name in lot_names:
+            key = normalize(name)
+            if key in self.exact or key in self.aliases:
+                continue
+            coords = self._by_lot(key)
+            if coords:
+                self.aliases[key] = coords
+
+    @classmethod
+    def from_files(cls, loc_txt: Path, google_json: Path = None, lots_csv: Path = None):
+        google, lot_names = [], []
+        if google_json and Path(google_json).exists():
+            google = json.loads(Path(google_json).read_text("utf-8"))
+        if lots_csv and Path(lots_csv).exists():
+            with Path(lots_csv).open(newline="", encoding="utf-8") as f:
+                lot_names = [r["name"] for r in csv.DictReader(f) if r.get("name")]
+        r = cls(load_location_txt(loc_txt), google, lot_names)
+        dbg(f"Location resolver: {len(r.exact)} names, {len(r.aliases)} aliases, "
+            f"{len(r.lots)}+{len(r.fallback)} lot ids")
+        return r
+
+    def _by_lot(self, key: str):
+        m = _LOT.match(key)
+        if not m:
+            return None
+        lot = m.group(1)
+        coords = self.lots.prefix(lot) or self.fallback.prefix(lot)
+        if coords:
+            return coords
+        m = _SUFFIX.match(lot)
+        if m:
+            return self.lots.get(m.group(1)) or self.fallback.get(m.group(1))
+        return None
+
+    def resolve(self, loc: str):
+        key = normalize(loc)
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                coords = self._memo[key]
+                if coords is None:
+                    self._misses[key] += 1
+                return coords
+        coords = self.exact.get(key) or self.aliases.get(key) or self._by_lot(key)
+        with self._lock:
+            self._memo[key] = coords
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+            if coords is None:
+                self._misses[key] += 1
+        return coords
+
+    def unresolved(self):
+        """[(location, times seen)] for every string that never resolved."""
+        with self._lock:
+            return self._misses.most_common()
+
+    def write_report(self, path: Path):
+        misses = self.unresolved()
+        Path(path).write_text(
+            "".join(f"{n},{loc}\n" for loc, n in misses), encoding="utf-8"
+        )
+        return len(misses)
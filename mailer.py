@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Background e-mail delivery over one reused, authenticated SMTP connection.
+
+send() only queues the message. A single worker thread delivers the
+queue: it keeps the connection open between messages (re-checking it with
+NOOP after it has been idle), stays under `per_minute`, and retries
+failures with exponential backoff. flush() waits for the queue to drain;
+close() flushes and logs out.
+
+    SMTP_HOST / SMTP_PORT / SMTP_STARTTLS=0 point it at a local stand-in,
+    e.g. `python -m aiosmtpd -n -l 127.0.0.1:1025`.
+"""
+import queue
+import smtplib
+import threading
+import time
+
+from util import TokenBucket, dbg
+
+class Mailer:
+    def __init__(self, user: str, password: str, host: str = "smtp.gmail.com",
+                 port: int = 587, starttls: bool = True, per_minute: float = 20,
+                 max_attempts: int = 5, backoff: float = 2.0, idle_check: float = 60):
+        self.user         = user
+        self.password     = password
+        self.host         = host
+        self.port         = port
+        self.starttls     = starttls
+        self.max_attempts = max_attempts
+        self.backoff      = backoff
+        self.idle_check   = idle_check
+        self.sent         = 0
+        self.failed       = 0
+        self._bucket      = TokenBucket(per_minute, per=60)
+        self._queue       = queue.Queue()
+        self._stop        = threading.Event()
+        self._smtp        = None
+        self._last_used   = 0.0
+        self._worker      = threading.Thread(target=self._run, name="mailer", daemon=True)
+        self._worker.start()
+
+    # ── public ────────────────────────────────────────────────────
+    def send(self, msg, label: str = "Email"):
+        """Queue `msg`; `label` only shows up in the delivery log line."""
+        if self._stop.is_set():
+            raise RuntimeError("mailer is closed")
+        self._queue.put((msg, label))
+
+    def pending(self) -> int:
+        return self._queue.unfinished_tasks
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until everything queued so far was delivered or given up on."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(left)
+        return True
+
+    def close(self, timeout: float = 60):
+        if not self.flush(timeout):
+            dbg(f"‼ mailer closing with {self.pending()} undelivered message(s)")
+        self._stop.set()
+        self._queue.put(None)
+        self._worker.join(timeout=5)
+        self._disconnect()
+
+    # ── worker ────────────────────────────────────────────────────
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+        smtp.ehlo()
+        if self.starttls:
+            smtp.starttls()
+            smtp.ehlo()
+        if self.password:
+            smtp.login(self.user, self.password)
+        self._smtp = smtp
+
+    def _disconnect(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            pass
+        self._smtp = None
+
+    def _connection(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_check:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected("NOOP refused")
+            except Exception:
+                self._disconnect()
+        if self._smtp is None:
+            self._connect()
+        return self._smtp
+
+    def _deliver(self, msg, label: str):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self._connection().send_message(msg)
+                self._last_used = time.monotonic()
+                self.sent += 1
+                dbg(f"{label} sent → {msg['To']}")
+                return
+            except smtplib.SMTPRecipientsRefused as e:
+                # retrying won't help a bad address
+                dbg(f"‼ {label} to {msg['To']} refused: {e.recipients}")
+                break
+            except Exception as e:
+                self._disconnect()
+                if attempt == self.max_attempts:
+                    dbg(f"‼ {label} to {msg['To']} failed after {attempt} attempts: {e}")
+                    break
+                delay = self.backoff * 2 ** (attempt - 1)
+                dbg(f"‼ {label} to {msg['To']} failed ({e}) – retry {attempt}/{self.max_attempts - 1} in {delay:.0f}s")
+                if self._stop.wait(delay):
+                    break
+        self.failed += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if not self._bucket.wait(self._stop):
+                    self.failed += 1
+                    continue
+                self._deliver(*item)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Cycle metrics in the Prometheus text format.
+
+run_cycle() times each phase with `metrics.phase(name)`. Counters are bumped
+where things happen: plates, tickets, Firestore reads/writes. Components
+that keep their own totals (Mailer.sent, BrowserSession.wait_timeouts,
+AimsHttpClient.fetches) are copied in with set() at the end of a cycle. The
+text goes to METRICS_FILE, in node_exporter textfile-collector format,
+and/or is served at http://127.0.0.1:METRICS_PORT/metrics.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from util import dbg
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    body = ",".join(f'{k}="{esc(v)}"' for k, v in sorted(labels.items()))
+    return "{" + body + "}"
+
+class Metrics:
+    def __init__(self, prefix: str = "taps"):
+        self.prefix = prefix
+        self._kind  = {}     # name → (type, help)
+        self._value = {}     # name → {label tuple: value}
+        self._lock  = threading.Lock()
+
+    def _declare(self, name: str, kind: str, help: str):
+        self._kind.setdefault(name, (kind, help))
+        self._value.setdefault(name, {})
+
+    def counter(self, name: str, help: str = ""):
+        self._declare(name, "counter", help)
+
+    def gauge(self, name: str, help: str = ""):
+        self._declare(name, "gauge", help)
+
+    def summary(self, name: str, help: str = ""):
+        self._declare(name, "summary", help)
+
+    # ── updates ───────────────────────────────────────────────────
+    def inc(self, name: str, n: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._value.setdefault(name, {})
+            series[key] = series.get(key, 0) + n
+
+    def set(self, name: str, value: float, **labels):
+        """Set a gauge, or copy in a counter a component already keeps."""
+        with self._lock:
+            self._value.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._value.setdefault(name, {})
+            count, total = series.get(key, (0, 0.0))
+            series[key] = (count + 1, total + value)
+
+    def get(self, name: str, **labels):
+        with self._lock:
+            return self._value.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a run_cycle() phase; errors are counted and re-raised."""
+        t0 = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.inc("phase_errors_total", phase=name)
+            raise
+        finally:
+            took = time.monotonic() - t0
+            self.observe("phase_seconds", took, phase=name)
+            self.set("phase_last_seconds", took, phase=name)
+            dbg(f"phase {name} took {took:.2f}s", event="phase", phase=name, seconds=round(took, 3))
+
+    # ── export ────────────────────────────────────────────────────
+    def render(self) -> str:
+        out = []
+        with self._lock:
+            for name in sorted(self._value):
+                kind, help = self._kind.get(name, ("untyped", ""))
+                full = f"{self.prefix}_{name}"
+                if help:
+                    out.append(f"# HELP {full} {help}")
+                out.append(f"# TYPE {full} {kind}")
+                for key, v in sorted(self._value[name].items()):
+                    labels = _labels(dict(key))
+                    if kind == "summary":
+                        out.append(f"{full}_count{labels} {v[0]}")
+                        out.append(f"{full}_sum{labels} {v[1]:.6f}")
+                    else:
+                        out.append(f"{full}{labels} {v}")
+        return "\n".join(out) + "\n"
+
+    def write(self, path: Path):
+        path = Path(path)
+        tmp  = path.with_name(path.name + ".tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        tmp.replace(path)
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Serve /metrics from a daemon thread; returns the server."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        dbg(f"Metrics on http://{host}:{server.server_address[1]}/metrics")
+        return server
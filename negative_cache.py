@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Persistent negative cache for (citation, plate) pairs whose lookup fails.
+
+A failed lookup holds the pair back for `base` seconds, doubling with every
+further failure up to `max_backoff`. After `max_attempts` failures the pair
+is refused outright. Every path that feeds the scrape queue asks blocked()
+first, so a typo that keeps being resubmitted (8MT404 vs 8GMT404) costs one
+lookup per backoff step instead of one per cycle. A successful lookup clears
+the entry. Entries that have not failed for `forget_after` seconds are dropped.
+
+Keys are normalized: the citation upper-cased, the plate upper-cased with
+spaces and dashes removed. State lives in negative_cache.json.
+"""
+import json
+import re
+import threading
+import time
+from pathlib import Path
+
+from util import dbg
+
+_PLATE_JUNK = re.compile(r"[\s\-]+")
+
+class NegativeCache:
+    def __init__(self, path: Path, base: float = 600, max_backoff: float = 7 * 86_400,
+                 max_attempts: int = 6, forget_after: float = 30 * 86_400):
+        self.path         = Path(path)
+        self.base         = base
+        self.max_backoff  = max_backoff
+        self.max_attempts = max_attempts
+        self.forget_after = forget_after
+        self.state        = {}
+        self._dirty       = False
+        self._lock        = threading.Lock()
+        if self.path.exists():
+            try:
+                self.state = json.loads(self.path.read_text("utf-8"))
+            except Exception as e:
+                dbg(f"‼ {self.path.name} unreadable, starting fresh: {e}")
+        dbg(f"Loaded {len(self.state)} negative cache entr{'y' if len(self.state) == 1 else 'ies'}")
+
+    @staticmethod
+    def key(citation: str, plate: str) -> str:
+        return f"{citation.strip().upper()},{_PLATE_JUNK.sub('', plate).upper()}"
+
+    @staticmethod
+    def split(row: str):
+        """(citation, plate) from a main.txt row; ValueError if it has no comma."""
+        citation, plate = row.split(",", 1)
+        return citation, plate
+
+    def __len__(self):
+        return len(self.state)
+
+    def blocked(self, citation: str, plate: str, now: float = None) -> bool:
+        """True while the pair is backing off or has used up its attempts."""
+        now = time.time() if now is None else now
+        with self._lock:
+            st = self.state.get(self.key(citation, plate))
+        return bool(st) and (st["failures"] >= self.max_attempts or now < st["retry_at"])
+
+    def blocked_row(self, row: str, now: float = None) -> bool:
+        try:
+            return self.blocked(*self.split(row), now=now)
+        except ValueError:
+            return False
+
+    def fail(self, citation: str, plate: str, err=None, now: float = None) -> dict:
+        now = time.time() if now is None else now
+        with self._lock:
+            st = self.state.setdefault(self.key(citation, plate), dict(failures=0, first_failed=now))
+            st["failures"]   += 1
+            st["last_failed"] = now
+            st["retry_at"]    = now + min(self.max_backoff, self.base * 2 ** (st["failures"] - 1))
+            st["error"]       = str(err)[:200] if err is not None else "no ticket found"
+            self._dirty = True
+            return dict(st)
+
+    def ok(self, citation: str, plate: str) -> bool:
+        """Clear the pair after a successful lookup; True if it had been failing."""
+        with self._lock:
+            if self.state.pop(self.key(citation, plate), None) is None:
+                return False
+            self._dirty = True
+            return True
+
+    def record(self, citation: str, plate: str, ok: bool, err=None):
+        if ok:
+            if self.ok(citation, plate):
+                dbg(f"{citation.upper()}/{plate} recovered – negative cache entry cleared")
+        else:
+            st = self.fail(citation, plate, err)
+            left = "giving up" if st["failures"] >= self.max_attempts else \
+                f"retry in {st['retry_at'] - st['last_failed']:.0f}s"
+            dbg(f"{citation.upper()}/{plate} failed {st['failures']}/{self.max_attempts} – {left}")
+
+    def save(self, now: float = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            stale = [k for k, st in self.state.items() if now - st["last_failed"] > self.forget_after]
+            for k in stale:
+                del self.state[k]
+            if not (self._dirty or stale):
+                return
+            data, self._dirty = json.dumps(self.state, indent=1, sort_keys=True), False
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            tmp.write_text(data, encoding="utf-8")
+            tmp.replace(self.path)
+        except Exception as e:
+            dbg(f"‼ Failed to save {self.path.name}: {e}")
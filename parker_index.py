@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Grid index over active parkers for ticket → parker radius queries.
+
+Parkers are bucketed into lat/lng cells of `cell_deg` degrees. A query only
+looks at the cells its radius can reach, then measures those candidates
+in one vectorised haversine (NumPy if available, plain math otherwise)
+against a single `now`.
+"""
+import math
+import datetime as dt
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from util import haversine, utc_tz
+
+EARTH_FT  = 3958.8 * 5280
+FT_PER_DEG = EARTH_FT * math.pi / 180   # one degree of latitude, in feet
+
+def haversine_many(lat, lng, lats, lngs):
+    """Feet from (lat, lng) to every point in lats/lngs."""
+    if np is None:
+        return [haversine(lat, lng, a, b) for a, b in zip(lats, lngs)]
+    f1 = math.radians(lat)
+    f2 = np.radians(lats)
+    d_f = f2 - f1
+    d_l = np.radians(lngs) - math.radians(lng)
+    a = np.sin(d_f / 2)**2 + math.cos(f1) * np.cos(f2) * np.sin(d_l / 2)**2
+    return 2 * EARTH_FT * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+class ParkerIndex:
+    def __init__(self, parkers=(), cell_deg: float = 0.01):
+        self.cell_deg = cell_deg
+        self.rebuild(parkers)
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg))
+
+    def rebuild(self, parkers):
+        parkers = list(parkers)
+        cells   = {}
+        for i, p in enumerate(parkers):
+            cells.setdefault(self._cell(p["lat"], p["lng"]), []).append(i)
+        lats = [p["lat"] for p in parkers]
+        lngs = [p["lng"] for p in parkers]
+        ends = [p["ts_end"].timestamp() for p in parkers]
+        if np is not None:
+            lats = np.asarray(lats, dtype=float)
+            lngs = np.asarray(lngs, dtype=float)
+            ends = np.asarray(ends, dtype=float)
+        # one assignment, so a query running on another thread sees old or new, never a mix
+        self._snap = (parkers, cells, lats, lngs, ends)
+
+    @property
+    def parkers(self):
+        return self._snap[0]
+
+    def __len__(self):
+        return len(self._snap[0])
+
+    def _candidates(self, cells, lat, lng, radius_ft):
+        d_lat = radius_ft / FT_PER_DEG
+        d_lng = d_lat / max(math.cos(math.radians(lat)), 1e-6)
+        r0, c0 = self._cell(lat - d_lat, lng - d_lng)
+        r1, c1 = self._cell(lat + d_lat, lng + d_lng)
+        if (r1 - r0 + 1) * (c1 - c0 + 1) >= len(cells):
+            # radius spans more cells than are occupied – walk the occupied ones
+            return [i for (r, c), idx in cells.items()
+                    if r0 <= r <= r1 and c0 <= c <= c1 for i in idx]
+        out = []
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                out.extend(cells.get((r, c), ()))
+        return out
+
+    def query(self, lat, lng, radius_ft, now=None):
+        """[(parker, dist_ft)] for every unexpired parker within radius_ft."""
+        parkers, cells, lats, lngs, ends = self._snap
+        if not parkers:
+            return []
+        now = (now or dt.datetime.now(utc_tz())).timestamp()
+        idx = self._candidates(cells, lat, lng, radius_ft)
+        if not idx:
+            return []
+        if np is None:
+            dists = haversine_many(lat, lng, [lats[i] for i in idx], [lngs[i] for i in idx])
+            return [(parkers[i], d) for i, d in zip(idx, dists)
+                    if d <= radius_ft and ends[i] >= now]
+        idx   = np.asarray(idx)
+        dists = haversine_many(lat, lng, lats[idx], lngs[idx])
+        keep  = (dists <= radius_ft) & (ends[idx] >= now)
+        return [(parkers[i], float(d)) for i, d in zip(idx[keep], dists[keep])]
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Active parkers keyed by parked_users doc id, expiring in ts_end order.
+
+A min-heap of (ts_end, version, doc id) hands out expired parkers in
+O(log n) each, whenever expire() is called: at the start of a sweep, and
+before an alert query between sweeps. A replaced or removed parker leaves
+its old heap entry behind. The version check skips it when popped.
+
+parked.txt is an append-only journal, one JSON object per line:
+    {"op": "+", "id": "<doc id>", "p": {email, full, loc_name, ts_end, hours, lat, lng}}
+    {"op": "-", "id": "<doc id>"}
+put()/remove() buffer lines and flush() appends them in one write. When
+the journal grows past `compact_factor` × the live entries, it is rewritten
+with just the "+" lines for active parkers. Expiry is never journaled:
+load() drops parkers whose ts_end has passed. Old-style CSV lines
+(email,full,loc,ts_end,hours,lat,lng) still load.
+"""
+import heapq
+import itertools
+import json
+import threading
+import datetime as dt
+from pathlib import Path
+
+from util import dbg, utc_tz
+
+_FIELDS = ("email", "full", "loc_name", "hours", "lat", "lng")
+
+def _encode(p: dict) -> dict:
+    return {**{k: p[k] for k in _FIELDS}, "ts_end": p["ts_end"].isoformat()}
+
+def _decode(d: dict) -> dict:
+    return dict(
+        email    = d["email"],
+        full     = d["full"],
+        loc_name = d["loc_name"],
+        ts_end   = dt.datetime.fromisoformat(d["ts_end"]),
+        hours    = float(d["hours"]),
+        lat      = float(d["lat"]),
+        lng      = float(d["lng"]),
+    )
+
+class ParkerRegistry:
+    def __init__(self, path: Path, compact_factor: float = 2.0, compact_min: int = 200):
+        self.path           = Path(path)
+        self.compact_factor = compact_factor
+        self.compact_min    = compact_min
+        self._by_id   = {}      # doc id → (version, parker)
+        self._heap    = []      # (ts_end timestamp, version, doc id)
+        self._ver     = itertools.count()
+        self._pending = []      # journal lines not yet written
+        self._lines   = 0       # lines in the journal file
+        self._retired = {}      # doc id → parker expired since the last drain_retired()
+        self.changes  = 0       # bumped on every effective add/remove/expiry
+        self._lock    = threading.RLock()
+        self.load()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._by_id
+
+    def get(self, doc_id):
+        row = self._by_id.get(doc_id)
+        return row[1] if row else None
+
+    def ids(self) -> list:
+        with self._lock:
+            return list(self._by_id)
+
+    def active(self) -> list:
+        with self._lock:
+            return [p for _, p in self._by_id.values()]
+
+    def snapshot(self):
+        """(active parkers, changes) read together under the lock."""
+        with self._lock:
+            return [p for _, p in self._by_id.values()], self.changes
+
+    # ── changes ───────────────────────────────────────────────────
+    def _set(self, doc_id: str, p: dict):
+        ver = next(self._ver)
+        self._by_id[doc_id] = (ver, p)
+        heapq.heappush(self._heap, (p["ts_end"].timestamp(), ver, doc_id))
+
+    def put(self, doc_id: str, p: dict) -> bool:
+        """Add or replace a parker; False (and nothing journaled) if it is unchanged."""
+        with self._lock:
+            old = self.get(doc_id)
+            if old == p:
+                return False
+            self._set(doc_id, p)
+            self._retired.pop(doc_id, None)
+            self._pending.append({"op": "+", "id": doc_id, "p": _encode(p)})
+            self.changes += 1
+            return True
+
+    def remove(self, doc_id: str) -> bool:
+        with self._lock:
+            if self._by_id.pop(doc_id, None) is None:
+                return False
+            self._pending.append({"op": "-", "id": doc_id})
+            self.changes += 1
+            return True
+
+    def expire(self, now: dt.datetime = None) -> list:
+        """Pop every parker whose ts_end has passed; [(doc id, parker)]."""
+        ts = (now or dt.datetime.now(utc_tz())).timestamp()
+        out = []
+        with self._lock:
+            while self._heap and self._heap[0][0] < ts:
+                _, ver, doc_id = heapq.heappop(self._heap)
+                row = self._by_id.get(doc_id)
+                if row is None or row[0] != ver:
+                    continue          # replaced or removed since it was pushed
+                del self._by_id[doc_id]
+                self._retired[doc_id] = row[1]
+                out.append((doc_id, row[1]))
+            if out:
+                self.changes += 1
+            # stale entries pile up under churn; rebuild the heap when they dominate
+            if len(self._heap) > 4 * len(self._by_id) + 64:
+                self._heap = [(p["ts_end"].timestamp(), v, i) for i, (v, p) in self._by_id.items()]
+                heapq.heapify(self._heap)
+        return out
+
+    def drain_retired(self) -> dict:
+        """Parkers expire() dropped since the last call, so their docs can be deleted."""
+        with self._lock:
+            out, self._retired = self._retired, {}
+            return out
+
+    # ── journal ───────────────────────────────────────────────────
+    def load(self):
+        with self._lock:
+            self._by_id, self._heap, self._lines, legacy = {}, [], 0, False
+            if not self.path.exists():
+                return
+            for i, ln in enumerate(self.path.read_text("utf-8").splitlines()):
+                if not ln.strip():
+                    continue
+                self._lines += 1
+                try:
+                    if ln.startswith("{"):
+                        rec = json.loads(ln)
+                        if rec["op"] == "+":
+                            self._set(rec["id"], _decode(rec["p"]))
+                        else:
+                            self._by_id.pop(rec["id"], None)
+                    else:
+                        legacy = True
+                        email, full, loc, ts_end, hours, lat, lng = ln.split(",", 6)
+                        self._set(f"legacy-{i}", _decode(dict(
+                            email=email, full=full, loc_name=loc, ts_end=ts_end,
+                            hours=hours, lat=lat, lng=lng)))
+                except (ValueError, KeyError) as e:
+                    dbg(f"‼ {self.path.name}:{i + 1} skipped: {e}")
+            self.expire()
+            self._retired = {}
+            dbg(f"Loaded {len(self)} active parker(s) from {self.path.name} ({self._lines} journal line(s))")
+            # old-style files are rewritten as a journal straight away
+            if legacy or (self._lines > self.compact_min and self._lines > self.compact_factor * len(self)):
+                self.compact()
+
+    def flush(self):
+        """Append buffered changes; compacts when the journal has grown too long."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if pending:
+                with self.path.open("a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in pending))
+                self._lines += len(pending)
+            if self._lines > self.compact_min and self._lines > self.compact_factor * len(self):
+                self.compact()
+            return len(pending)
+
+    def compact(self):
+        with self._lock:
+            lines = [
+                json.dumps({"op": "+", "id": doc_id, "p": _encode(p)}, separators=(",", ":")) + "\n"
+                for doc_id, (_, p) in sorted(self._by_id.items(), key=lambda kv: kv[1][1]["ts_end"])
+            ]
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text("".join(lines), encoding="utf-8")
+            tmp.replace(self.path)
+            dbg(f"Compacted {self.path.name}: {self._lines} → {len(lines)} line(s)")
+            self._lines   = len(lines)
+            self._pending = []
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Per-plate revisit scheduling for scrape_main().
+
+Every main.txt row keeps when it was last checked, when it last turned up
+a new ticket and how many times in a row it failed. A row's revisit
+interval grows with how long it has been quiet (ratio × idle time, clamped
+to [min_interval, max_interval]), so a plate ticketed this morning is
+checked every few minutes and one that's been silent for months about once
+a day. Failing rows back off exponentially instead.
+"""
+import heapq
+import json
+import time
+from pathlib import Path
+
+from util import dbg
+
+class PlateScheduler:
+    def __init__(self, path: Path, budget: int = 50, min_interval: float = 60,
+                 max_interval: float = 86_400, ratio: float = 0.1):
+        self.path         = Path(path)
+        self.budget       = budget
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.ratio        = ratio
+        self.state        = {}
+        if self.path.exists():
+            try:
+                self.state = json.loads(self.path.read_text("utf-8"))
+            except Exception as e:
+                dbg(f"‼ {self.path.name} unreadable, starting fresh: {e}")
+        dbg(f"Loaded revisit state for {len(self.state)} plate(s)")
+
+    @staticmethod
+    def key(row: str) -> str:
+        return row.strip().upper()
+
+    def _entry(self, key: str, now: float) -> dict:
+        return self.state.setdefault(key, dict(
+            first_seen   = now,
+            last_checked = None,
+            last_new     = None,
+            failures     = 0,
+        ))
+
+    def interval(self, st: dict, now: float) -> float:
+        if st["failures"]:
+            return min(self.max_interval, self.min_interval * 2 ** st["failures"])
+        idle = now - (st["last_new"] or st["first_seen"])
+        return min(self.max_interval, max(self.min_interval, idle * self.ratio))
+
+    def due_at(self, st: dict, now: float) -> float:
+        if st["last_checked"] is None:
+            return 0.0
+        return st["last_checked"] + self.interval(st, now)
+
+    def pick(self, rows: list, now: float = None) -> list:
+        """Rows due this cycle, most overdue first, at most `budget` of them."""
+        now  = time.time() if now is None else now
+        heap = []
+        for row in rows:
+            k = self.key(row)
+            heapq.heappush(heap, (self.due_at(self._entry(k, now), now), k, row))
+        picked = []
+        while heap and len(picked) < self.budget:
+            due, _, row = heapq.heappop(heap)
+            if due > now:
+                break
+            picked.append(row)
+        dbg(f"Scheduler picked {len(picked)}/{len(rows)} row(s) "
+            f"({len(heap)} not due or over budget)")
+        return picked
+
+    def record(self, row: str, ok: bool, new_tickets: bool, now: float = None):
+        now = time.time() if now is None else now
+        st  = self._entry(self.key(row), now)
+        st["last_checked"] = now
+        if ok:
+            st["failures"] = 0
+            if new_tickets:
+                st["last_new"] = now
+        else:
+            st["failures"] += 1
+        return st
+
+    def failures(self, row: str) -> int:
+        st = self.state.get(self.key(row))
+        return st["failures"] if st else 0
+
+    def save(self, rows: list):
+        """Drop state for rows no longer in main.txt and persist the rest."""
+        keep = {self.key(r) for r in rows}
+        self.state = {k: v for k, v in self.state.items() if k in keep}
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps(self.state, indent=1), encoding="utf-8")
+            tmp.replace(self.path)
+        except Exception as e:
+            dbg(f"‼ Failed to save {self.path.name}: {e}")
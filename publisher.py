@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Background, change-aware `firebase deploy --only hosting`.
+
+request() just marks the site dirty. A worker thread waits until
+`debounce` seconds pass with no new request, or `max_delay` after the
+first one, so a burst of changes becomes one deploy. It then hashes the
+deployable files under public/, using firebase.json's ignore globs, and
+runs the deploy command only if the hash differs from the last successful
+deploy. Status and timings go to publish_status.json, which also keeps the
+last deployed hash across restarts.
+
+DEPLOY_CMD overrides the command, e.g. DEPLOY_CMD="python -c pass" for tests.
+"""
+import fnmatch
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import threading
+import time
+import datetime as dt
+from pathlib import Path
+
+from util import dbg, utc_tz
+
+def default_command():
+    cmd = os.getenv("DEPLOY_CMD")
+    if cmd:
+        return shlex.split(cmd)
+    # pick the right CLI on Windows vs. others
+    firebase_executable = "firebase.cmd" if os.name == "nt" else "firebase"
+    return [firebase_executable, "deploy", "--only", "hosting"]
+
+def hosting_ignores(firebase_json: Path):
+    try:
+        cfg = json.loads(Path(firebase_json).read_text("utf-8"))
+        return cfg.get("hosting", {}).get("ignore", [])
+    except Exception:
+        return ["firebase.json", "**/.*", "**/node_modules/**"]
+
+def _ignored(rel: str, patterns) -> bool:
+    for pat in patterns:
+        # "**/x" should also match x at the top level
+        if fnmatch.fnmatch(rel, pat) or (pat.startswith("**/") and fnmatch.fnmatch(rel, pat[3:])):
+            return True
+    return False
+
+class HostingPublisher:
+    def __init__(self, public_dir: Path, status_path: Path, command=None, ignore=(),
+                 debounce: float = 30, max_delay: float = 300, cwd: Path = None):
+        self.public_dir  = Path(public_dir)
+        self.status_path = Path(status_path)
+        self.command     = command or default_command()
+        self.ignore      = list(ignore)
+        self.debounce    = debounce
+        self.max_delay   = max_delay
+        self.cwd         = cwd or self.public_dir.parent
+        self._file_hash  = {}          # rel path → (mtime_ns, size, sha256)
+        self._first_req  = None
+        self._last_req   = None
+        self._cond       = threading.Condition()
+        self._stop       = False
+        self._busy       = False
+        self.status      = {}
+        if self.status_path.exists():
+            try:
+                self.status = json.loads(self.status_path.read_text("utf-8"))
+            except Exception:
+                self.status = {}
+        self._worker = threading.Thread(target=self._run, name="publisher", daemon=True)
+        self._worker.start()
+
+    # ── hashing ───────────────────────────────────────────────────
+    def content_hash(self) -> str:
+        h, seen = hashlib.sha256(), set()
+        for root, dirs, files in os.walk(self.public_dir):
+            dirs.sort()
+            for name in sorted(files):
+                path = Path(root) / name
+                rel  = path.relative_to(self.public_dir).as_posix()
+                if _ignored(rel, self.ignore):
+                    continue
+                st = path.stat()
+                cached = self._file_hash.get(rel)
+                if not cached or cached[:2] != (st.st_mtime_ns, st.st_size):
+                    cached = (st.st_mtime_ns, st.st_size, hashlib.sha256(path.read_bytes()).hexdigest())
+                    self._file_hash[rel] = cached
+                seen.add(rel)
+                h.update(rel.encode() + b"\0" + cached[2].encode() + b"\n")
+        for rel in set(self._file_hash) - seen:
+            del self._file_hash[rel]
+        return h.hexdigest()
+
+    # ── public ────────────────────────────────────────────────────
+    def request(self):
+        with self._cond:
+            now = time.monotonic()
+            if self._first_req is None:
+                self._first_req = now
+            self._last_req = now
+            self._cond.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Publish anything pending right away and wait for it to finish."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._first_req is not None:
+                self._first_req = self._last_req = -float("inf")
+                self._cond.notify_all()
+            while self._first_req is not None or self._busy:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
+    def close(self, timeout: float = 300):
+        self.flush(timeout)
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self._worker.join(timeout=5)
+
+    # ── worker ────────────────────────────────────────────────────
+    def _due_in(self, now: float):
+        if self._first_req is None:
+            return None
+        return max(0.0, min(self._last_req + self.debounce, self._first_req + self.max_delay) - now)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stop:
+                    wait = self._due_in(time.monotonic())
+                    if wait == 0:
+                        break
+                    self._cond.wait(wait)
+                if self._stop:
+                    return
+                self._first_req = self._last_req = None
+                self._busy = True
+            try:
+                self._publish()
+            except Exception as e:
+                dbg(f"‼ publish step crashed: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _save_status(self):
+        tmp = self.status_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.status, indent=1), encoding="utf-8")
+        tmp.replace(self.status_path)
+
+    def _publish(self):
+        t0 = time.monotonic()
+        digest = self.content_hash()
+        hash_s = time.monotonic() - t0
+        self.status["last_check"] = dt.datetime.now(utc_tz()).isoformat(timespec="seconds")
+        if digest == self.status.get("deployed_hash"):
+            dbg(f"public/ unchanged ({digest[:12]}) – skipping Firebase deploy")
+            self.status["skipped"] = self.status.get("skipped", 0) + 1
+            self._save_status()
+            return
+        dbg(f"Starting Firebase deploy… (content {digest[:12]}, hashed in {hash_s:.2f}s)")
+        t1 = time.monotonic()
+        try:
+            result = subprocess.run(self.command, cwd=self.cwd, capture_output=True, text=True)
+            ok, out = result.returncode == 0, (result.stdout if result.returncode == 0 else result.stderr)
+            code = result.returncode
+        except OSError as e:
+            ok, out, code = False, str(e), None
+        took = time.monotonic() - t1
+        self.status.update(
+            last_deploy_at = self.status["last_check"],
+            last_ok        = ok,
+            last_exit      = code,
+            last_seconds   = round(took, 2),
+            last_output    = (out or "")[-2000:],
+        )
+        if ok:
+            self.status["deployed_hash"] = digest
+            self.status["deploys"] = self.status.get("deploys", 0) + 1
+            dbg(f"Firebase deploy succeeded in {took:.1f}s:\n{out}")
+        else:
+            self.status["failures"] = self.status.get("failures", 0) + 1
+            dbg(f"‼ Firebase deploy failed (exit {code}) after {took:.1f}s:\n{out}")
+        self._save_status()
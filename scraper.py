@@ -1,133 +1,196 @@
 #!/usr/bin/env python3
-import os
-import re
+"""TAPS ticket scraper and alerter.
+
+    python scraper.py [run [--once]]          the scrape → alert → publish loop
+    python scraper.py stats                   ticket and main.txt counts
+    python scraper.py lookup PLATE CITATION   one lookup, tickets printed as JSON
+    python scraper.py sweep-users             one pass over the Firestore collections
+    python scraper.py publish                 export + feed, deploy if public/ changed
+"""
+import argparse
 import json
-import math
+import os
+import sys
 import threading
-import smtplib
-import subprocess
 import time
 import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
 from email.message import EmailMessage
 from pathlib import Path
 
-try:
-    from zoneinfo import ZoneInfo
-except ImportError:
-    ZoneInfo = None
-
 import firebase_admin
 from firebase_admin import credentials, firestore
 from google.api_core import exceptions as g_exceptions
 
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
-def utc_tz():
-    try:
-        return ZoneInfo("UTC") if ZoneInfo else dt.timezone.utc
-    except Exception:
-        return dt.timezone.utc
-
-def dbg(msg: str):
-    print(f"[{dt.datetime.now().isoformat(timespec='seconds')}] {msg}")
-
-def haversine(lat1, lon1, lat2, lon2) -> float:
-    R = 3958.8  # miles
-    f1, f2 = math.radians(lat1), math.radians(lat2)
-    d_f, d_l = math.radians(lat2 - lat1), math.radians(lon2 - lon1)
-    a = math.sin(d_f / 2)**2 + math.cos(f1)*math.cos(f2)*math.sin(d_l / 2)**2
-    return 2 * R * math.asin(math.sqrt(a)) * 5280  # feet
+import aims_http
+from alerts import AlertDigest
+from browser import BrowserPool
+from feed import TicketFeed
+from listeners import CollectionWatch
+from locations import LocationResolver
+from firestore_batch import WriteBatcher
+from hotspots import HotspotAggregator
+from mailer import Mailer
+from metrics import Metrics
+from negative_cache import NegativeCache
+from publisher import HostingPublisher, hosting_ignores
+from subscribers import SubscriberIndex
+from ticket_store import TicketStore
+from parker_index import ParkerIndex
+from parker_registry import ParkerRegistry
+from plate_scheduler import PlateScheduler
+from util import Lazy, dbg, ensure, started, utc_tz
 
 BASE        = Path(__file__).parent
 MAIN_PATH   = BASE / "main.txt"
 SCRAPED_TXT = BASE / "public" / "scraped.txt"
+TICKETS_DB  = BASE / "tickets.db"
 PARKED_TXT  = BASE / "parked.txt"
 LOC_TXT     = BASE / "location.txt"
+GOOGLE_JSON = BASE / "ucsclots_google.json"
+LOTS_CSV    = BASE / "ucsclotz.csv"
+UNRESOLVED_TXT = BASE / "unresolved_locations.txt"
 VALIDATE_PATH = BASE / "validate.txt"
+PUBLISH_STATUS = BASE / "publish_status.json"
+PLATE_STATE   = BASE / "plate_state.json"
+NEG_CACHE     = BASE / "negative_cache.json"
 
-# load static campus‐location → coords
-with LOC_TXT.open(encoding="utf-8") as f:
-    txt = re.sub(r"(\bname\b|\blat\b|\blng\b)\s*:", r'"\1":', f.read().strip())
-    location_data = {
-        r["name"].upper(): (r["lat"], r["lng"])
-        for r in json.loads("[" + txt.rstrip(",") + "]")
-    }
-dbg(f"Loaded {len(location_data)} location → coordinate mappings")
+# held while main.txt is read-then-appended or rewritten; the sweeps and
+# scrape_main() touch it from different threads
+_main_lock = threading.Lock()
 
-# tickets we've already appended to scraped.txt
-if SCRAPED_TXT.exists():
-    scraped = {
-        ln.split(",")[0].lstrip('"').upper()
-        for ln in SCRAPED_TXT.read_text("utf-8").splitlines()
-    }
-else:
-    scraped = set()
-dbg(f"Loaded {len(scraped)} tickets already in scraped.txt")
-
-# load existing parkers from parked.txt
-parkers = []
-if PARKED_TXT.exists():
-    for ln in PARKED_TXT.read_text("utf-8").splitlines():
-        email, full, loc, ts_end, hours, lat, lng = ln.split(",", 6)
-        parkers.append(dict(
-            email    = email,
-            full     = full,
-            loc_name = loc,
-            ts_end   = dt.datetime.fromisoformat(ts_end),
-            hours    = float(hours),
-            lat      = float(lat),
-            lng      = float(lng),
-        ))
-dbg(f"Loaded {len(parkers)} active parker(s) from parked.txt")
+# Everything below is built on first use (util.Lazy), so `stats` or a one-off
+# `lookup` never reads parked.txt, talks to Firebase or launches Chrome.
+def _load_resolver():
+    r = LocationResolver.from_files(LOC_TXT, GOOGLE_JSON, LOTS_CSV)
+    dbg(f"Loaded {len(r.location_data)} location → coordinate mappings")
+    return r
+
+# static campus‐location → coords
+resolver = Lazy(_load_resolver)
+
+def _open_store():
+    store = TicketStore(TICKETS_DB)
+    if not store.count() and SCRAPED_TXT.exists():
+        dbg(f"Imported {store.import_scraped(SCRAPED_TXT)} ticket(s) from scraped.txt")
+    dbg(f"Ticket store ready → {store.count()} ticket(s)")
+    return store
+
+# every ticket we've scraped; public/scraped.txt is exported from here
+scraped = Lazy(_open_store)
+# public/feed/: month shards + manifest + delta, so clients fetch only what's new
+feed = Lazy(lambda: TicketFeed(scraped, BASE / "public" / "feed"))
+# public/hotspots.json: ticket counts by lot × hour of the week, updated from the new tickets only
+hotspots = Lazy(lambda: HotspotAggregator(
+    scraped, get_coords, BASE / "public" / "hotspots.json", extra=[BASE / "citations2.txt"]
+))
+
+# active parkers by parked_users doc id, expiring in ts_end order; parked.txt is its journal
+registry = Lazy(lambda: ParkerRegistry(PARKED_TXT))
+_index_changes = None
+# the scrape workers and the sweeps both sync the index; one at a time
+_index_lock    = threading.Lock()
+
+def _build_index():
+    global _index_changes
+    active, _index_changes = registry.snapshot()
+    return ParkerIndex(active)
+
+# grid index over registry.active() for the alert queries
+parker_index = Lazy(_build_index)
+
+def _sync_index():
+    """Expire parkers whose time is up and re-index if the registry changed."""
+    global _index_changes
+    with _index_lock:
+        registry.expire()
+        # parkers and change count from the same moment, so the index never lags its counter
+        active, changes = registry.snapshot()
+        if changes != _index_changes:
+            parker_index.rebuild(active)
+            _index_changes = changes
+
+def _init_firestore():
+    dbg("Initialising Firebase…")
+    firebase_admin.initialize_app(credentials.Certificate(str(BASE / "cred.json")))
+    client = firestore.client()
+    dbg("Firebase ready ✔")
+    return client
+
+db = Lazy(_init_firestore)
+# plate → current_users, so save_ticket() can notify owners without a query per ticket
+subscribers = Lazy(lambda: SubscriberIndex(db))
+
+# FIRESTORE_LISTEN=1: keep parked_users/new_users/bruh in sync with snapshot
+# listeners and sweep only what changed, instead of streaming them every cycle
+FIRESTORE_LISTEN  = os.getenv("FIRESTORE_LISTEN", "0") == "1"
+LISTEN_FULL_EVERY = float(os.getenv("LISTEN_FULL_EVERY", "3600"))
+_changed   = threading.Event()
+watches    = {}
+_last_full = {}
 
-dbg("Initialising Firebase…")
-firebase_admin.initialize_app(credentials.Certificate("cred.json"))
-db = firestore.client()
-dbg("Firebase ready ✔")
+def start_watches():
+    """Attach the snapshot listeners (the `run` loop only)."""
+    if not FIRESTORE_LISTEN or watches:
+        return
+    for col in ("parked_users", "new_users", "bruh"):
+        watches[col] = CollectionWatch(db, col, _changed)
+    for w in watches.values():
+        if not w.wait_ready():
+            dbg(f"⚠ no initial snapshot for {w.col} yet – continuing")
 
 GMAIL_USER = "taps.slug.tracker@gmail.com"
-GMAIL_PW   = os.getenv("GMAIL_APP_PASSWORD")
-if not GMAIL_PW:
-    raise RuntimeError("Set env var GMAIL_APP_PASSWORD to your Gmail app password")
+
+def _start_mailer():
+    password = os.getenv("GMAIL_APP_PASSWORD")
+    if not password:
+        raise RuntimeError("Set env var GMAIL_APP_PASSWORD to your Gmail app password")
+    return Mailer(
+        GMAIL_USER, password,
+        host       = os.getenv("SMTP_HOST", "smtp.gmail.com"),
+        port       = int(os.getenv("SMTP_PORT", "587")),
+        starttls   = os.getenv("SMTP_STARTTLS", "1") != "0",
+        per_minute = float(os.getenv("SMTP_PER_MINUTE", "20")),
+    )
+
+# one authenticated connection, fed from a background queue so sends never block scraping
+mailer = Lazy(_start_mailer)
 
 def get_coords(loc: str):
-    key = loc.upper().strip()
-    if key in location_data:
-        return location_data[key]
-    m = re.match(r"\s*(\d+\w*)", key)
-    if m:
-        prefix = m.group(1)
-        for name, coords in location_data.items():
-            if name.startswith(prefix):
-                return coords
-    return None
-
-def send_alert(to_email: str, to_name: str, p_loc: str, t_loc: str, dist_ft: float, ticket_date=None):
-    # Only send alert if ticket_date is today
-    if ticket_date is not None:
-        today = dt.datetime.now(utc_tz()).date()
-        if ticket_date != today:
-            dbg(f"Not sending alert to {to_email} because ticket is not from today.")
-            return
+    return resolver.resolve(loc)
+
+def send_alert_digest(to_email: str, to_name: str, matches: list):
+    """One email listing every citation seen near the recipient's car since the last one."""
     msg = EmailMessage()
     msg["From"]    = GMAIL_USER
     msg["To"]      = to_email
-    msg["Subject"] = "TAPS spotted near your car!"
+    msg["Subject"] = ("TAPS spotted near your car!" if len(matches) == 1
+                      else f"TAPS spotted near your car ({len(matches)} citations)")
+    lines = "".join(
+        f"  • {m['t_loc']} – roughly {int(m['dist_ft']):,} ft from your car at {m['p_loc']}"
+        f" (#{m['citation']}{', ' + m['when'] if m.get('when') else ''})\n"
+        for m in sorted(matches, key=lambda m: m["dist_ft"])
+    )
     msg.set_content(
         f"Hey {to_name},\n\n"
-        f"TAPS was just seen issuing a citation at {t_loc}.\n"
-        f"They're roughly {int(dist_ft):,} ft from your car parked at {p_loc}.\n"
+        f"TAPS was just seen issuing {'a citation' if len(matches) == 1 else 'citations'} near you:\n"
+        f"{lines}"
         "Keep an eye out!\n\n— TAPS Tracker"
     )
-    with smtplib.SMTP("smtp.gmail.com", 587) as smtp:
-        smtp.ehlo()
-        smtp.starttls()
-        smtp.login(GMAIL_USER, GMAIL_PW)
-        smtp.send_message(msg)
-    dbg(f"Alert email sent → {to_email}")
+    mailer.send(msg, "Alert email")
+    dbg(f"Alert digest queued → {to_email} ({len(matches)} citation(s))")
+
+# ALERT_WINDOW: seconds a recipient's matches are collected before their digest
+# goes out; ALERT_DEDUP_TTL: how long a (recipient, citation) pair stays quiet
+ALERT_RADIUS_FT = float(os.getenv("ALERT_RADIUS_FT", "10000"))
+alerts = Lazy(lambda: AlertDigest(
+    send_alert_digest,
+    window = float(os.getenv("ALERT_WINDOW", "120")),
+    ttl    = float(os.getenv("ALERT_DEDUP_TTL", str(12 * 3600))),
+))
 
 def send_account_confirmation_email(to_email: str, to_name: str):
     msg = EmailMessage()
@@ -140,12 +203,8 @@ def send_account_confirmation_email(to_email: str, to_name: str):
         "We have verified your account and you're all good to go.\n\n"
         "— TAPS Tracker"
     )
-    with smtplib.SMTP("smtp.gmail.com", 587) as smtp:
-        smtp.ehlo()
-        smtp.starttls()
-        smtp.login(GMAIL_USER, GMAIL_PW)
-        smtp.send_message(msg)
-    dbg(f"Account confirmation email sent → {to_email}")
+    mailer.send(msg, "Account confirmation email")
+    dbg(f"Account confirmation email queued → {to_email}")
 
 def send_ticket_notification_email(to_email: str, to_name: str, citation_number: str, date_str: str, location: str):
     msg = EmailMessage()
@@ -158,30 +217,80 @@ def send_ticket_notification_email(to_email: str, to_name: str, citation_number:
         "We hate to break it to you. Keep your head up and appeal it as soon as possible!!\n\n"
         "— TAPS Tracker"
     )
-    with smtplib.SMTP("smtp.gmail.com", 587) as smtp:
-        smtp.ehlo()
-        smtp.starttls()
-        smtp.login(GMAIL_USER, GMAIL_PW)
-        smtp.send_message(msg)
-    dbg(f"Ticket notification email sent → {to_email}")
-
-dbg("Launching headless Chrome…")
-opts = webdriver.ChromeOptions()
-opts.add_argument("--headless")
-opts.add_argument("--disable-gpu")
-opts.add_argument("--disable-logging")
-opts.add_argument("--log-level=3")
-driver = webdriver.Chrome(options=opts)
-dbg("Chrome ready ✔")
-
-WAIT     = WebDriverWait(driver, 6)
-WAIT_REL = WebDriverWait(driver, 2)
-BASE_URL = "https://ucsc.aimsparking.com/tickets/"
+    mailer.send(msg, "Ticket notification email")
+    dbg(f"Ticket notification email queued → {to_email}")
+
+# number of Chrome sessions scrape_main() fans main.txt rows out across
+SCRAPE_WORKERS = max(1, int(os.getenv("SCRAPE_WORKERS", "1")))
+pool = Lazy(lambda: BrowserPool(
+    SCRAPE_WORKERS,
+    lean       = os.getenv("CHROME_LEAN", "1") != "0",
+    max_pages  = int(os.getenv("CHROME_MAX_PAGES", "500")),
+    max_rss_mb = float(os.getenv("CHROME_MAX_RSS_MB", "1024")),
+))
+
+# "sweep" re-checks every main.txt row each cycle; "adaptive" only the rows
+# the scheduler says are due, at most SCRAPE_BUDGET of them
+SCRAPE_MODE         = os.getenv("SCRAPE_MODE", "sweep").lower()
+SCRAPE_MAX_FAILURES = int(os.getenv("SCRAPE_MAX_FAILURES", "3"))
+scheduler = Lazy(lambda: PlateScheduler(
+    PLATE_STATE,
+    budget       = int(os.getenv("SCRAPE_BUDGET", "50")),
+    min_interval = float(os.getenv("SCRAPE_MIN_INTERVAL", "60")),
+    max_interval = float(os.getenv("SCRAPE_MAX_INTERVAL", "86400")),
+))
+
+# (citation, plate) pairs whose lookups keep failing; checked before anything is queued
+negcache = Lazy(lambda: NegativeCache(
+    NEG_CACHE,
+    base         = float(os.getenv("NEGCACHE_BASE", "600")),
+    max_backoff  = float(os.getenv("NEGCACHE_MAX_BACKOFF", str(7 * 86_400))),
+    max_attempts = int(os.getenv("NEGCACHE_MAX_ATTEMPTS", "6")),
+))
+
+publisher = Lazy(lambda: HostingPublisher(
+    BASE / "public", PUBLISH_STATUS,
+    ignore    = hosting_ignores(BASE / "firebase.json"),
+    debounce  = float(os.getenv("DEPLOY_DEBOUNCE", "30")),
+    max_delay = float(os.getenv("DEPLOY_MAX_DELAY", "300")),
+))
+
+BASE_URL = os.getenv("AIMS_BASE_URL", "https://ucsc.aimsparking.com/tickets/")
+# "http" tries the plain-HTTP lookup first and falls back to Chrome; "selenium" always uses Chrome
+LOOKUP_ENGINE = os.getenv("LOOKUP_ENGINE", "http").lower()
+aims = Lazy(lambda: aims_http.AimsHttpClient(BASE_URL, record_dir=os.getenv("AIMS_RECORD_DIR")))
 _stop    = threading.Event()
 
-def save_ticket(tid: str, loc: str, when: str):
-    if tid.upper() in scraped:
-        return
+# METRICS_FILE: Prometheus text written after every cycle; METRICS_PORT: served on localhost
+METRICS_FILE = os.getenv("METRICS_FILE", str(BASE / "metrics.prom"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+metrics = Metrics()
+metrics.summary("phase_seconds", "Duration of each run_cycle() phase")
+metrics.gauge("phase_last_seconds", "Duration of the most recent run of each phase")
+metrics.counter("phase_errors_total", "Phases that raised")
+metrics.counter("cycles_total", "Completed scraping cycles")
+metrics.counter("plates_total", "main.txt rows looked up, by result")
+metrics.counter("tickets_saved_total", "Tickets new to the store")
+metrics.counter("negative_cache_skips_total", "Rows not looked up because their pair is backing off, by path")
+metrics.gauge("negative_cache_entries", "(citation, plate) pairs in the negative cache")
+metrics.counter("firestore_reads_total", "Documents read, by collection")
+metrics.counter("firestore_writes_total", "Document writes committed, by result")
+metrics.counter("alerts_total", "Parker/ticket proximity matches, by result")
+metrics.gauge("alerts_pending", "Matches waiting for their recipient's digest")
+metrics.counter("alert_digests_total", "Alert digests handed to the mailer, by result")
+metrics.counter("emails_total", "Emails handed to SMTP, by result")
+metrics.gauge("emails_queued", "Emails waiting in the mailer queue")
+metrics.counter("webdriver_wait_timeouts_total", "WebDriverWait timeouts across the Chrome pool")
+metrics.counter("webdriver_wait_seconds_total", "Seconds spent in WebDriverWait.until()")
+metrics.counter("chrome_restarts_total", "Chrome sessions recycled or restarted")
+metrics.counter("aims_http_fetches_total", "Plain-HTTP AIMS requests")
+metrics.counter("aims_http_seconds_total", "Seconds spent in plain-HTTP AIMS requests")
+metrics.counter("deploys_total", "Firebase Hosting deploys, by result")
+metrics.gauge("deploy_last_seconds", "Duration of the last Firebase deploy")
+metrics.gauge("tickets_stored", "Tickets in tickets.db")
+metrics.gauge("parkers_active", "Parkers currently watched for nearby tickets")
+
+def save_ticket(tid: str, loc: str, when: str, plate: str = None):
     date, clock = when.split()[:2]
     # Check if time has AM/PM indicator
     if len(when.split()) > 2:
@@ -195,21 +304,19 @@ def save_ticket(tid: str, loc: str, when: str):
     else:
         clock = clock.replace(":", "")
     m, d, y = map(int, date.split("/"))
-    with SCRAPED_TXT.open("a", encoding="utf-8") as f:
-        f.write(f'"{tid.upper()},{loc},{clock},{m}/{d}/{y}",\n')
-    scraped.add(tid.upper())
-    dbg(f"Saved → scraped.txt : {tid},{loc}")
+    if not scraped.add(tid, loc, clock, m, d, y, plate):
+        return
+    metrics.inc("tickets_saved_total")
+    dbg(f"Saved → tickets.db : {tid},{loc}")
     # Check if the ticket date is today and send notification
     today = dt.datetime.now(utc_tz()).date()
     ticket_date = dt.date(y, m, d)
-    if ticket_date == today:
+    if ticket_date == today and plate:
         try:
-            users = db.collection("current_users").where("licensePlate", "==", tid).stream()
-            for user_doc in users:
-                user_data = user_doc.to_dict()
+            for email, full in subscribers.lookup(plate):
                 send_ticket_notification_email(
-                    user_data.get("email", ""),
-                    user_data.get("fullName", "User"),
+                    email,
+                    full,
                     tid,
                     f"{m}/{d}/{y}",
                     loc
@@ -217,7 +324,7 @@ def save_ticket(tid: str, loc: str, when: str):
         except Exception as e:
             dbg(f"‼ Failed to send ticket notification email: {e}")
 
-def _extract_ticket_meta():
+def _extract_ticket_meta(driver):
     try:
         issue = driver.find_element(
             By.XPATH,
@@ -231,13 +338,116 @@ def _extract_ticket_meta():
     except:
         return None, None
 
-def _process_related(done: set, plate: str, tkts: list):
-    try:
-        WAIT_REL.until(EC.presence_of_element_located(
-            (By.XPATH, "//a[contains(@aria-label,'View ticket')]")
-        ))
-    except:
+def _alert_nearby(tid: str, loc: str, when: str = None, today_only: bool = False):
+    if today_only:
+        m, d, y = map(int, when.split()[0].split("/"))
+        if dt.date(y, m, d) != dt.datetime.now(utc_tz()).date():
+            return
+    coords = get_coords(loc)
+    if not coords:
         return
+    t_lat, t_lng = coords
+    # O(1) unless someone's time ran out since the last call
+    _sync_index()
+    for p, dist_ft in parker_index.query(t_lat, t_lng, ALERT_RADIUS_FT):
+        queued = alerts.add(p["email"], p["full"], tid,
+                            p_loc=p["loc_name"], t_loc=loc, dist_ft=dist_ft, when=when)
+        metrics.inc("alerts_total", result="queued" if queued else "suppressed")
+
+def _alert_related(tid: str, loc: str, when: str):
+    _alert_nearby(tid, loc, when, today_only=True)
+
+# reads every "View ticket" link on the page in one round trip
+_RELATED_LINKS_JS = """
+return Array.from(document.querySelectorAll("a[aria-label*='View ticket']"))
+    .map(a => [a.getAttribute("aria-label") || "", a.href || "", a.getAttribute("href") || ""]);
+"""
+
+# fetches and parses all related detail pages inside the already-open page
+_FETCH_DETAILS_JS = """
+const urls = arguments[0], done = arguments[arguments.length - 1];
+Promise.all(urls.map(([id, url]) =>
+    fetch(url, {credentials: "same-origin"})
+        .then(r => r.ok ? r.text() : "")
+        .then(html => {
+            const doc = new DOMParser().parseFromString(html, "text/html");
+            const ok = Array.from(doc.querySelectorAll("h3"))
+                .some(h => h.textContent.trim() === "Ticket Information");
+            const f = {};
+            doc.querySelectorAll("p").forEach(p => {
+                const s = p.querySelector("strong");
+                if (s) f[s.textContent.trim()] =
+                    p.textContent.replace(s.textContent, "").replace(/\\s+/g, " ").trim();
+            });
+            return [id, ok ? f["Location:"] || null : null, ok ? f["Issue Date and Time:"] || null : null];
+        })
+        .catch(() => [id, null, null])
+)).then(done);
+"""
+
+# "fetch": one in-page script for all related tickets, falling back to one
+# driver.get() per ticket; "click": the old click → read → back() loop
+RELATED_MODE = os.getenv("RELATED_MODE", "fetch").lower()
+
+def _related_links(driver):
+    """{citation: url or None} for every related-ticket link on the page."""
+    links = {}
+    for lbl, href, raw in driver.execute_script(_RELATED_LINKS_JS) or []:
+        if "#" not in lbl:
+            continue
+        cid = lbl.split("#")[1].strip().upper()
+        scripted = not raw or raw.startswith("#") or raw.lower().startswith("javascript:")
+        links.setdefault(cid, None if scripted else href)
+    return links
+
+def _record_related(tid: str, loc: str, when: str, plate: str, done: set, tkts: list):
+    save_ticket(tid, loc, when, plate)
+    tkts.append({
+        "citationNumber": tid,
+        "location": loc,
+        "issueDate": when
+    })
+    done.add(tid)
+    _alert_related(tid, loc, when)
+
+def _process_related(session, done: set, plate: str, tkts: list):
+    driver = session.driver
+    # the search result is already loaded, so the links are there or they aren't
+    links = {
+        cid: url for cid, url in _related_links(driver).items()
+        if cid not in done and cid not in scraped
+    }
+    if not links:
+        return
+    direct = {cid: url for cid, url in links.items() if url}
+    if RELATED_MODE != "click" and len(direct) == len(links):
+        try:
+            found = driver.execute_async_script(_FETCH_DETAILS_JS, list(direct.items()))
+        except Exception as e:
+            dbg(f"‼ in-page fetch of {len(direct)} related ticket(s) failed: {e}")
+            found = []
+        for tid, loc, when in found or []:
+            if loc and when:
+                _record_related(tid, loc, when, plate, done, tkts)
+        # anything the script couldn't read: one navigation each, no back()
+        for tid, url in direct.items():
+            if tid in done:
+                continue
+            try:
+                session.get(url)
+                session.wait.until(EC.presence_of_element_located(
+                    (By.XPATH, "//h3[normalize-space()='Ticket Information']")
+                ))
+                loc, when = _extract_ticket_meta(driver)
+                if loc and when:
+                    _record_related(tid, loc, when, plate, done, tkts)
+            except Exception as e:
+                dbg(f"‼ related ticket {tid} skipped: {e}")
+        return
+    _process_related_clicks(session, done, plate, tkts, set(links))
+
+def _process_related_clicks(session, done: set, plate: str, tkts: list, wanted: set):
+    driver = session.driver
     while True:
         unseen = []
         for a in driver.find_elements(
@@ -246,64 +456,89 @@ def _process_related(done: set, plate: str, tkts: list):
             lbl = a.get_attribute("aria-label")
             if "#" in lbl:
                 cid = lbl.split("#")[1].strip().upper()
-                if cid not in done:
+                if cid in wanted and cid not in done:
                     unseen.append((cid, a))
         if not unseen:
             break
         tid, btn = unseen[0]
+        # never retry the same link, even if reading it failed
+        wanted.discard(tid)
         try:
             driver.execute_script("arguments[0].click();", btn)
-            WAIT.until(EC.presence_of_element_located(
+            session.note_page()
+            session.wait.until(EC.presence_of_element_located(
                 (By.XPATH, "//h3[normalize-space()='Ticket Information']")
             ))
-            loc, when = _extract_ticket_meta()
+            loc, when = _extract_ticket_meta(driver)
             if loc and when:
-                save_ticket(tid, loc, when)
-                tkts.append({
-                    "citationNumber": tid,
-                    "location": loc,
-                    "issueDate": when
-                })
-                done.add(tid)
-                coords = get_coords(loc)
-                if coords:
-                    t_lat, t_lng = coords
-                    m, d, y = map(int, when.split()[0].split("/"))
-                    ticket_date = dt.date(y, m, d)
-                    for p in parkers:
-                        if dt.datetime.now(utc_tz()) > p["ts_end"]:
-                            continue
-                        dist_ft = haversine(t_lat, t_lng, p["lat"], p["lng"])
-                        if dist_ft <= 10_000:
-                            try:
-                                send_alert(
-                                    p["email"], p["full"],
-                                    p["loc_name"], loc, dist_ft, ticket_date=ticket_date
-                                )
-                            except Exception as e:
-                                dbg(f"‼ email error → {p['email']}: {e}")
+                _record_related(tid, loc, when, plate, done, tkts)
         except:
             pass
         finally:
             try:
                 driver.back()
-                WAIT.until(EC.presence_of_element_located(
+                session.note_page()
+                session.wait.until(EC.presence_of_element_located(
                     (By.XPATH, "//a[contains(@aria-label,'View ticket')]")
                 ))
             except:
                 break
 
-def process(plate: str, citation: str):
+def _process_http(plate: str, citation: str):
     tid = citation.upper()
-    dbg(f"==== {tid} / {plate} ====")
+    dbg(f"==== {tid} / {plate} [http] ====")
+    page = aims.search(plate, citation)
+    if page is None:
+        dbg(f"‼ Error processing {tid}: no ticket found")
+        return False, []
+    if scraped.has_all({tid} | set(page.related)):
+        dbg(f"All {len(page.related) + 1} tickets already scraped – skipping details.")
+        return True, []
+    tickets_data = [{
+        "citationNumber": tid,
+        "location": page.location,
+        "issueDate": page.issue_date
+    }]
+    save_ticket(tid, page.location, page.issue_date, plate)
+    _alert_nearby(tid, page.location, page.issue_date)
+    for rid, url in page.related.items():
+        # like _process_related(): stored tickets aren't fetched again
+        if rid == tid or rid in scraped:
+            continue
+        try:
+            rel = aims.ticket(rid, url)
+        except aims_http.LookupParseError as e:
+            dbg(f"‼ related ticket {rid} skipped: {e}")
+            continue
+        save_ticket(rid, rel.location, rel.issue_date, plate)
+        tickets_data.append({
+            "citationNumber": rid,
+            "location": rel.location,
+            "issueDate": rel.issue_date
+        })
+        _alert_related(rid, rel.location, rel.issue_date)
+    return True, tickets_data
+
+def process(plate: str, citation: str, session=None):
+    if session is None:
+        if LOOKUP_ENGINE == "http":
+            try:
+                return _process_http(plate, citation)
+            except aims_http.LookupParseError as e:
+                dbg(f"HTTP lookup for {citation.upper()} unusable ({e}) – falling back to Chrome")
+        with pool.session() as s:
+            return process(plate, citation, s)
+    driver, wait = session.driver, session.wait
+    tid = citation.upper()
+    dbg(f"==== {tid} / {plate} [{session.name}] ====")
     tickets_data = []
     done = {tid}
     try:
-        driver.get(BASE_URL)
-        WAIT.until(EC.presence_of_element_located((By.ID, "plate_vin"))).send_keys(plate)
-        WAIT.until(EC.presence_of_element_located((By.ID, "ticket_number"))).send_keys(citation)
-        WAIT.until(EC.element_to_be_clickable((By.ID, "search_ticket"))).click()
-        WAIT.until(EC.presence_of_element_located(
+        session.get(BASE_URL)
+        wait.until(EC.presence_of_element_located((By.ID, "plate_vin"))).send_keys(plate)
+        wait.until(EC.presence_of_element_located((By.ID, "ticket_number"))).send_keys(citation)
+        wait.until(EC.element_to_be_clickable((By.ID, "search_ticket"))).click()
+        wait.until(EC.presence_of_element_located(
             (By.XPATH, "//h3[normalize-space()='Ticket Information']")
         ))
         # collect related
@@ -314,36 +549,25 @@ def process(plate: str, citation: str):
             lbl = a.get_attribute("aria-label")
             if "#" in lbl:
                 page_ids.add(lbl.split("#")[1].strip().upper())
-        if page_ids.issubset(scraped):
+        if scraped.has_all(page_ids):
             dbg(f"All {len(page_ids)} tickets already scraped – skipping details.")
+            session.record_ok()
             return True, []
-        loc, when = _extract_ticket_meta()
+        loc, when = _extract_ticket_meta(driver)
         if loc and when:
-            save_ticket(tid, loc, when)
+            save_ticket(tid, loc, when, plate)
             tickets_data.append({
                 "citationNumber": tid,
                 "location": loc,
                 "issueDate": when
             })
-            coords = get_coords(loc)
-            if coords:
-                t_lat, t_lng = coords
-                for p in parkers:
-                    if dt.datetime.now(utc_tz()) > p["ts_end"]:
-                        continue
-                    dist_ft = haversine(t_lat, t_lng, p["lat"], p["lng"])
-                    if dist_ft <= 528_000:
-                        try:
-                            send_alert(
-                                p["email"], p["full"],
-                                p["loc_name"], loc, dist_ft
-                            )
-                        except Exception as e:
-                            dbg(f"‼ email error → {p['email']}: {e}")
-        _process_related(done, plate, tickets_data)
+            _alert_nearby(tid, loc, when)
+        _process_related(session, done, plate, tickets_data)
+        session.record_ok()
         return True, tickets_data
 
     except Exception as e:
+        session.record_error(e)
         dbg(f"‼ Error processing {tid}: {e}")
         msg = str(e)
         # If Selenium aborted by navigation, treat as success
@@ -352,99 +576,171 @@ def process(plate: str, citation: str):
         return False, []
 
 
+def _fetch_docs(col: str):
+    """(docs, removed ids, full) to sweep: listener deltas when FIRESTORE_LISTEN, else the whole collection."""
+    w = watches.get(col)
+    if w is None:
+        docs = list(db.collection(col).stream())
+        metrics.inc("firestore_reads_total", len(docs), collection=col)
+        return docs, set(), True
+    now  = time.monotonic()
+    # a periodic pass over the cached docs still ages out entries nobody touches
+    full = now - _last_full.get(col, 0) > LISTEN_FULL_EVERY
+    if full:
+        _last_full[col] = now
+    # reads are counted as the listener receives them (export_metrics), not per drain:
+    # a full pass over the cache costs nothing
+    docs, removed = w.drain(full)
+    return docs, removed, full
+
+def _parker_from_doc(doc, now_utc):
+    """(parker, expired) for one parked_users doc; parker is None when unusable."""
+    d        = doc.to_dict() or {}
+    email    = d.get("email", "").strip()
+    full     = d.get("fullName", "").strip()
+    loc      = d.get("location", "").strip()
+    hours    = float(d.get("hours", 0) or 0)
+    start_ts = d.get("start")
+    if not (email and full and loc and start_ts and hours):
+        return None, False
+
+    start_dt = start_ts.replace(tzinfo=utc_tz())
+    end_dt   = start_dt + dt.timedelta(hours=hours)
+    if now_utc > end_dt:
+        return None, True
+
+    # ── handle Current Location as a custom coord
+    coords = None
+    if loc.lower() == "current location":
+        coord_map = d.get("coords") or {}
+        lat = coord_map.get("lat")
+        lng = coord_map.get("lng")
+        if lat is None or lng is None:
+            dbg(f"⚠ Missing coords for Current Location parker: {email}")
+            return None, False
+        coords = (lat, lng)
+    else:
+        coords = get_coords(loc)
+        if not coords:
+            dbg(f"⚠ Unknown location: {loc}")
+            return None, False
+
+    lat, lng = coords
+    return dict(
+        email    = email,
+        full     = full,
+        loc_name = loc,
+        ts_end   = end_dt,
+        hours    = hours,
+        lat      = lat,
+        lng      = lng
+    ), False
+
 def check_parked_users(col: str = "parked_users"):
-    global parkers
     dbg("------ Checking parked_users collection ------")
     now_utc = dt.datetime.now(utc_tz())
     try:
-        docs = list(db.collection(col).stream())
+        docs, removed, full = _fetch_docs(col)
     except g_exceptions.PermissionDenied as e:
         dbg(f"‼ parked_users check skipped – permission denied: {e.message}")
         return
 
-    existing = {(p["email"], p["loc_name"]) for p in parkers}
-    active = []
+    expired = WriteBatcher(db, "expired parked_users deletes")
+    before  = registry.changes
+    if full:
+        seen = {doc.id for doc in docs}
+        removed = set(removed) | {doc_id for doc_id in registry.ids() if doc_id not in seen}
+    for doc_id in removed:
+        registry.remove(doc_id)
     for doc in docs:
-        d        = doc.to_dict() or {}
-        email    = d.get("email", "").strip()
-        full     = d.get("fullName", "").strip()
-        loc      = d.get("location", "").strip()
-        hours    = float(d.get("hours", 0) or 0)
-        start_ts = d.get("start")
-        if not (email and full and loc and start_ts and hours):
-            continue
+        p, is_expired = _parker_from_doc(doc, now_utc)
+        if is_expired:
+            expired.delete(doc.reference)
+            registry.remove(doc.id)
+        elif p:
+            registry.put(doc.id, p)
+        else:
+            registry.remove(doc.id)
+    # parkers whose time ran out since their doc last changed, here or between sweeps
+    registry.expire(now_utc)
+    for doc_id in registry.drain_retired():
+        if not doc_id.startswith("legacy-"):
+            expired.delete(db.collection(col).document(doc_id))
+    _log_writes(expired.commit(), {})
 
-        start_dt = start_ts.replace(tzinfo=utc_tz())
-        end_dt   = start_dt + dt.timedelta(hours=hours)
-        if now_utc > end_dt:
-            try:
-                doc.reference.delete()
-            except:
-                pass
-            continue
+    written = registry.flush()
+    _sync_index()
+    dbg(f"parked.txt journal +{written} line(s) → {len(registry)} active parker(s)"
+        + ("" if full else f" ({len(docs)} changed, {len(removed)} removed)")
+        + ("" if registry.changes != before else ", unchanged"))
+    dbg("------ parked_users check complete ------")
 
-        # ── handle Current Location as a custom coord
-        coords = None
-        if loc.lower() == "current location":
-            coord_map = d.get("coords") or {}
-            lat = coord_map.get("lat")
-            lng = coord_map.get("lng")
-            if lat is None or lng is None:
-                dbg(f"⚠ Missing coords for Current Location parker: {email}")
-                continue
-            coords = (lat, lng)
-        else:
-            coords = get_coords(loc)
-            if not coords:
-                dbg(f"⚠ Unknown location: {loc}")
-                continue
 
-        lat, lng = coords
-        active.append(dict(
-            email    = email,
-            full     = full,
-            loc_name = loc,
-            ts_end   = end_dt,
-            hours    = hours,
-            lat      = lat,
-            lng      = lng
-        ))
 
-    # rewrite parked.txt
-    PARKED_TXT.write_text(
-        "\n".join(
-            f"{p['email']},{p['full']},{p['loc_name']},"
-            f"{p['ts_end'].isoformat()},{p['hours']},{p['lat']},{p['lng']}"
-            for p in active
-        ) + ("\n" if active else ""),
-        encoding="utf-8"
-    )
-    parkers = active
-    dbg(f"Updated parked.txt → {len(parkers)} active parker(s)")
-    dbg("------ parked_users check complete ------")
 
 
+def _log_writes(results: dict, notes: dict):
+    for tag, (ok, err) in results.items():
+        metrics.inc("firestore_writes_total", result="ok" if ok else "failed")
+        if ok:
+            if tag in notes:
+                dbg(notes[tag])
+        else:
+            dbg(f"‼ Firestore write failed for {tag}: {err}")
 
+def _append_main(lines) -> list:
+    """Append rows not already in main.txt (case-insensitive); returns those written."""
+    with _main_lock:
+        existing = set()
+        if MAIN_PATH.exists():
+            existing = {ln.strip().upper() for ln in MAIN_PATH.read_text("utf-8").splitlines() if ln.strip()}
+        new_lines = []
+        for line in lines:
+            if line.upper() not in existing:
+                new_lines.append(line)
+                existing.add(line.upper())
+        if new_lines:
+            with MAIN_PATH.open("a", encoding="utf-8") as f:
+                f.write("\n".join(new_lines) + "\n")
+    return new_lines
 
+def _lookup(plate: str, citation: str):
+    """process() as (ok, tickets, error) – never raises; the outcome goes to the negative cache."""
+    try:
+        ok, tickets = process(plate, citation)
+        err = None
+    except Exception as e:
+        ok, tickets, err = False, [], e
+    negcache.record(citation, plate, ok, err)
+    return ok, tickets, err
 
-def precheck_new_users(col: str = "new_users"):
+def precheck_new_users(col: str = "new_users", lookup=None):
+    """Promote fresh new_users entries; their lookups run on the `lookup` executor when given."""
     dbg("------ Checking new_users for fresh submissions ------")
     try:
-        docs = list(db.collection(col).stream())
+        docs, _, _ = _fetch_docs(col)
     except g_exceptions.PermissionDenied as e:
         dbg(f"‼ new_users check skipped – permission denied: {e.message}")
         return
 
     now = dt.datetime.now(utc_tz())
-    existing = set()
-    if MAIN_PATH.exists():
-        existing = {
-            ln.strip().upper()
-            for ln in MAIN_PATH.read_text("utf-8").splitlines()
-            if ln.strip()
-        }
 
-    new_lines = []
+    # phase 1: invalid/expired entries and current_users promotions go out together;
+    # phase 2 deletes promoted new_users docs only once their promotion landed
+    writes   = WriteBatcher(db, "new_users writes")
+    notes    = {}
+    promoted = []
+
+    def retire(doc, ts, citation, why):
+        age = (now - ts).total_seconds() / 86400
+        if age > 3:
+            writes.delete(doc.reference, tag=doc.id)
+            notes[doc.id] = f"Removed {why} entry older than 3 days: {citation}"
+        else:
+            writes.update(doc.reference, {"valid": False}, tag=doc.id)
+            notes[doc.id] = f"Marked entry invalid ({why}): {citation}"
+
+    candidates = []
     for doc in docs:
         d = doc.to_dict() or {}
         plate      = (d.get("licensePlate") or "").strip()
@@ -457,106 +753,106 @@ def precheck_new_users(col: str = "new_users"):
         if valid_flag is False:
             age = (now - ts).total_seconds() / 86400
             if age > 3:
-                doc.reference.delete()
-                dbg(f"Removed expired invalid entry: {citation}")
+                writes.delete(doc.reference, tag=doc.id)
+                notes[doc.id] = f"Removed expired invalid entry: {citation}"
             else:
                 dbg(f"Ignoring recent invalid entry: {citation}")
             continue
 
         if not (plate and citation):
-            age = (now - ts).total_seconds() / 86400
-            if age > 3:
-                doc.reference.delete()
-                dbg(f"Removed malformed entry older than 3 days: {citation}")
-            else:
-                doc.reference.update({"valid": False})
-                dbg(f"Marked entry invalid: {citation}")
+            retire(doc, ts, citation, "malformed")
             continue
+        if negcache.blocked(citation, plate):
+            metrics.inc("negative_cache_skips_total", path="new_users")
+            retire(doc, ts, citation, "failing lookup")
+            continue
+        candidates.append((doc, d, plate, citation, ts))
 
-        try:
-            ok, tickets = process(plate, citation)
-        except Exception as e:
-            age = (now - ts).total_seconds() / 86400
-            if age > 3:
-                doc.reference.delete()
-                dbg(f"Removed errored entry older than 3 days: {citation}")
-            else:
-                doc.reference.update({"valid": False})
-                dbg(f"Marked entry invalid after error: {citation}")
+    # all lookups at once, sharing the scrape workers with main.txt rows
+    if lookup is None:
+        outcomes = [_lookup(plate, citation) for _, _, plate, citation, _ in candidates]
+    else:
+        futures  = [lookup.submit(_lookup, plate, citation) for _, _, plate, citation, _ in candidates]
+        outcomes = [f.result() for f in futures]
+
+    for (doc, d, plate, citation, ts), (ok, tickets, err) in zip(candidates, outcomes):
+        if err is not None:
+            retire(doc, ts, citation, "errored")
             continue
 
         if ok and not tickets and citation in scraped:
             tickets = []
         elif not ok or not tickets:
-            age = (now - ts).total_seconds() / 86400
-            if age > 3:
-                doc.reference.delete()
-                dbg(f"Removed no-tickets entry older than 3 days: {citation}")
-            else:
-                doc.reference.update({"valid": False})
-                dbg(f"Marked entry invalid (no tickets): {citation}")
+            retire(doc, ts, citation, "no-tickets")
             continue
 
-        try:
-            uid = (d.get("email") or plate or doc.id).upper()
-            update_data = {
-                "fullName":      d.get("fullName", ""),
-                "email":         d.get("email", ""),
-                "licensePlate":  plate,
-                "lastUpdated":   firestore.SERVER_TIMESTAMP
-            }
-            if tickets:
-                update_data["tickets"] = firestore.ArrayUnion(*tickets)
-            db.collection("current_users").document(uid).set(update_data, merge=True)
-            # Send confirmation email after promotion
-            send_account_confirmation_email(d.get("email", ""), d.get("fullName", "User"))
-        except Exception as e:
-            dbg(f"‼ Firestore write failed for {citation}: {e}")
-            continue
+        uid = (d.get("email") or plate or doc.id).upper()
+        update_data = {
+            "fullName":      d.get("fullName", ""),
+            "email":         d.get("email", ""),
+            "licensePlate":  plate,
+            "lastUpdated":   firestore.SERVER_TIMESTAMP
+        }
+        if tickets:
+            update_data["tickets"] = firestore.ArrayUnion(*tickets)
+        tag = f"current_users/{uid} ← {citation}"
+        writes.set(db.collection("current_users").document(uid), update_data, merge=True, tag=tag)
+        promoted.append((tag, uid, doc, d, citation, plate))
 
-        line = f"{citation},{plate}"
-        if line.upper() not in existing:
-            new_lines.append(line)
-            existing.add(line.upper())
+    results = writes.commit()
+    _log_writes(results, notes)
 
-        doc.reference.delete()
-        dbg(f"Processed and removed new_users entry: {citation}")
+    lines = []
+    for tag, uid, doc, d, citation, plate in promoted:
+        if not results.get(tag, (False, None))[0]:
+            continue
+        subscribers.add(uid, plate, d.get("email", ""), d.get("fullName", "User"))
+        # Send confirmation email after promotion
+        send_account_confirmation_email(d.get("email", ""), d.get("fullName", "User"))
+        lines.append(f"{citation},{plate}")
+        writes.delete(doc.reference, tag=doc.id)
+        notes[doc.id] = f"Processed and removed new_users entry: {citation}"
 
+    # already looked up above, so these wait for the next cycle rather than the scrape queue
+    new_lines = _append_main(lines)
     if new_lines:
-        with MAIN_PATH.open("a", encoding="utf-8") as f:
-            f.write("\n".join(new_lines) + "\n")
         dbg(f"Added {len(new_lines)} ticket(s) from new_users to main.txt")
+    _log_writes(writes.commit(), notes)
+    negcache.save()
 
     dbg("------ new_users check complete ------")
 
 
 
 
-def transfer_firestore_to_main(col: str = "bruh"):
+def transfer_firestore_to_main(col: str = "bruh", on_rows=None):
+    """Move bruh docs into main.txt; `on_rows(new_lines)` can queue them for scraping right away."""
     dbg("------ Transferring bruh → main.txt ------")
     try:
-        docs = list(db.collection(col).stream())
+        docs, _, _ = _fetch_docs(col)
     except g_exceptions.PermissionDenied as e:
         dbg(f"‼ transfer skipped – permission denied: {e.message}")
         return
-    existing = {ln.strip().upper() for ln in MAIN_PATH.read_text("utf-8").splitlines()} if MAIN_PATH.exists() else set()
-    new_lines = []
+    lines = []
+    deletes = WriteBatcher(db, "bruh deletes")
     for doc in docs:
         d = doc.to_dict() or {}
         t = (d.get("citationNumber") or "").strip().upper()
         p = (d.get("licensePlate") or "").strip()
-        if not (t and p):
-            doc.reference.delete()
-            continue
-        line = f"{t},{p}"
-        if line.upper() not in existing:
-            new_lines.append(line)
-            existing.add(line.upper())
-        doc.reference.delete()
+        if t and p:
+            if negcache.blocked(t, p):
+                metrics.inc("negative_cache_skips_total", path="bruh")
+                dbg(f"Dropped {t},{p} from bruh – its lookup keeps failing")
+            else:
+                lines.append(f"{t},{p}")
+        deletes.delete(doc.reference)
+    # main.txt first, so a failed delete only means the row is seen again next cycle
+    new_lines = _append_main(lines)
     if new_lines:
-        with MAIN_PATH.open("a", encoding="utf-8") as f:
-            f.write("\n".join(new_lines) + "\n")
         dbg(f"Appended {len(new_lines)} new ticket(s) to main.txt")
+        if on_rows is not None:
+            on_rows(new_lines)
+    _log_writes(deletes.commit(), {})
     dbg("------ transfer complete ------")
 
 def _rewrite_main(rows):
@@ -576,92 +872,302 @@ def _rewrite_main(rows):
     except Exception as e:
         dbg(f"‼ Failed to update main.txt: {e}")
 
+def _scrape_row(ln: str):
+    try:
+        citation, plate = (p.strip() for p in ln.split(",", 1))
+    except ValueError as e:
+        return False, [], e
+    return _lookup(plate, citation)
+
+class _ScrapeQueue:
+    """main.txt rows fanned out over the scrape workers; more can be added while it runs."""
+
+    def __init__(self, ex):
+        self.ex         = ex
+        self.started_at = time.monotonic()
+        self.done_at    = self.started_at
+        self._futs      = {}      # row key → (row, future)
+        self._lock      = threading.Lock()
+
+    def _done(self, _fut):
+        self.done_at = time.monotonic()
+
+    def add(self, rows):
+        with self._lock:
+            for ln in rows:
+                key = ln.strip().upper()
+                # _due_rows() already filtered the cycle's batch; this catches rows streamed in
+                if negcache.blocked_row(ln):
+                    metrics.inc("negative_cache_skips_total", path="main")
+                    continue
+                if key not in self._futs:
+                    fut = self.ex.submit(_scrape_row, ln)
+                    fut.add_done_callback(self._done)
+                    self._futs[key] = (ln, fut)
+
+    def results(self) -> dict:
+        """{row: (ok, tickets, err)} for everything queued so far, once it has finished."""
+        with self._lock:
+            items = list(self._futs.values())
+        return {ln: f.result() for ln, f in items}
+
+def _due_rows():
+    if not MAIN_PATH.exists():
+        return []
+    rows = [ln.strip() for ln in MAIN_PATH.read_text("utf-8").splitlines() if ln.strip()]
+    # before pick(), so rows still backing off don't use up SCRAPE_BUDGET
+    held = {ln for ln in rows if negcache.blocked_row(ln)}
+    if held:
+        metrics.inc("negative_cache_skips_total", len(held), path="main")
+        rows = [ln for ln in rows if ln not in held]
+    return scheduler.pick(rows) if SCRAPE_MODE == "adaptive" else rows
+
+def _apply_results(results: dict):
+    """Record lookups with the scheduler and drop rows that failed for good from main.txt."""
+    if not results:
+        return
+    adaptive = SCRAPE_MODE == "adaptive"
+    drop = set()
+    for ln, (ok, tickets, err) in results.items():
+        metrics.inc("plates_total", result="ok" if ok else "failed")
+        if adaptive:
+            # process() returns tickets only when the page had something not yet scraped
+            st = scheduler.record(ln, ok, bool(tickets))
+        # Only keep if it succeeded
+        if ok:
+            continue
+        if adaptive and st["failures"] < SCRAPE_MAX_FAILURES:
+            dbg(f"Lookup failed for {ln} ({st['failures']}/{SCRAPE_MAX_FAILURES}) – backing off")
+            continue
+        if err is not None:
+            dbg(f"‼ Exception processing line: {ln} — {err}")
+            dbg(f"Removed invalid entry from main.txt due to exception: {ln}")
+        else:
+            dbg(f"Removed invalid entry from main.txt: {ln}")
+        with VALIDATE_PATH.open("a", encoding="utf-8") as vf:
+            vf.write(ln + "\n")
+        drop.add(ln.strip().upper())
+    # re-read under the lock: rows appended since the scrape started must survive
+    with _main_lock:
+        rows = []
+        if MAIN_PATH.exists():
+            rows = [ln.strip() for ln in MAIN_PATH.read_text("utf-8").splitlines() if ln.strip()]
+        valid = [ln for ln in rows if ln.upper() not in drop]
+        dbg(f"Valid lines to keep in main.txt: {valid}")
+        _rewrite_main(valid)
+    if adaptive:
+        scheduler.save(valid)
+    negcache.save()
+
 def scrape_main():
     if not MAIN_PATH.exists():
         dbg("main.txt not found – nothing to scrape.")
         return
-    rows = [ln.strip() for ln in MAIN_PATH.read_text("utf-8").splitlines() if ln.strip()]
-    valid = []
-    for ln in rows:
+    batch = _due_rows()
+    # rows are spread over the Chrome pool / HTTP client
+    with ThreadPoolExecutor(max_workers=SCRAPE_WORKERS, thread_name_prefix="scrape") as ex:
+        queue = _ScrapeQueue(ex)
+        queue.add(batch)
+        results = queue.results()
+    _apply_results(results)
+
+def _sweep(name: str, fn, **kwargs):
+    try:
+        with metrics.phase(name):
+            fn(**kwargs)
+    except Exception as e:
+        dbg(f"‼ {name} failed: {e}")
+
+def export_metrics():
+    """Copy component totals into `metrics` and write METRICS_FILE."""
+    # only what this process has started; reading a Lazy would build it
+    if started(mailer):
+        metrics.set("emails_total", mailer.sent, result="sent")
+        metrics.set("emails_total", mailer.failed, result="failed")
+        metrics.set("emails_queued", mailer.pending())
+    if started(alerts):
+        metrics.set("alert_digests_total", alerts.sent, result="sent")
+        metrics.set("alert_digests_total", alerts.failed, result="failed")
+        metrics.set("alerts_pending", alerts.pending())
+    for col, w in watches.items():
+        metrics.set("firestore_reads_total", w.reads, collection=col)
+    if started(pool):
+        chrome = pool.totals()
+        metrics.set("webdriver_wait_timeouts_total", chrome["wait_timeouts"])
+        metrics.set("webdriver_wait_seconds_total", round(chrome["wait_s"], 3))
+        metrics.set("chrome_restarts_total", chrome["restarts"])
+    if started(aims):
+        metrics.set("aims_http_fetches_total", aims.fetches)
+        metrics.set("aims_http_seconds_total", round(aims.fetch_s, 3))
+    if started(publisher):
+        st = publisher.status
+        metrics.set("deploys_total", st.get("deploys", 0), result="ok")
+        metrics.set("deploys_total", st.get("failures", 0), result="failed")
+        metrics.set("deploys_total", st.get("skipped", 0), result="skipped")
+        metrics.set("deploy_last_seconds", st.get("last_seconds", 0))
+    if started(scraped):
+        metrics.set("tickets_stored", scraped.count())
+    if started(registry):
+        metrics.set("parkers_active", len(registry))
+    if started(negcache):
+        metrics.set("negative_cache_entries", len(negcache))
+    if METRICS_FILE:
         try:
-            citation, plate = (p.strip() for p in ln.split(",", 1))
-            ok, _ = process(plate, citation)
-            # Only keep if it succeeded
-            if ok:
-                valid.append(ln)
-            else:
-                dbg(f"Removed invalid entry from main.txt: {ln}")
-                with VALIDATE_PATH.open("a", encoding="utf-8") as vf:
-                    vf.write(ln + "\n")
-        except Exception as e:
-            dbg(f"‼ Exception processing line: {ln} — {e}")
-            dbg(f"Removed invalid entry from main.txt due to exception: {ln}")
-            with VALIDATE_PATH.open("a", encoding="utf-8") as vf:
-                vf.write(ln + "\n")
-            # Do NOT add to valid
-    dbg(f"Valid lines to keep in main.txt: {valid}")
-    _rewrite_main(valid)
-
-def deduplicate_scraped_txt():
-    if not SCRAPED_TXT.exists():
-        return
-    lines = [ln for ln in SCRAPED_TXT.read_text("utf-8").splitlines() if ln.strip()]
-    seen = set()
-    deduped = []
-    for ln in lines:
-        # Extract citation number (first field, before first comma, strip quotes and spaces)
-        citation = ln.split(",", 1)[0].strip('"').strip().upper()
-        if citation not in seen:
-            seen.add(citation)
-            deduped.append(ln)
-    SCRAPED_TXT.write_text("\n".join(deduped) + ("\n" if deduped else ""), encoding="utf-8")
-    dbg(f"Deduplicated scraped.txt → {len(deduped)} unique tickets")
+            metrics.write(METRICS_FILE)
+        except OSError as e:
+            dbg(f"‼ Failed to write {METRICS_FILE}: {e}")
 
 def run_cycle():
-    check_parked_users()
-    precheck_new_users()
-    transfer_firestore_to_main()
-    scrape_main()
-    deduplicate_scraped_txt()
-    dbg("Done – scraping cycle complete")
-
-    # pick the right CLI on Windows vs. others
-    firebase_executable = "firebase.cmd" if os.name == "nt" else "firebase"
-    dbg("Starting Firebase deploy…")
-    try:
-        result = subprocess.run(
-            [firebase_executable, "deploy", "--only", "hosting"],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        dbg(f"Firebase deploy succeeded:\n{result.stdout}")
-    except subprocess.CalledProcessError as e:
-        dbg(f"‼ Firebase deploy failed (exit {e.returncode}):\n{e.stderr}")
+    t0 = time.monotonic()
+    plates0, saved0 = metrics.get("plates_total", result="ok"), metrics.get("tickets_saved_total")
+    with metrics.phase("subscribers_refresh"):
+        try:
+            metrics.inc("firestore_reads_total", subscribers.refresh(), collection=subscribers.col)
+        except Exception as e:
+            dbg(f"‼ current_users refresh failed – using cached index: {e}")
+    # The Firestore sweeps run beside the scrape workers instead of before them.
+    # new_users lookups share the workers; rows moved in from bruh join the
+    # queue as soon as they reach main.txt.
+    with metrics.phase("pipeline"):
+        batch = _due_rows()
+        with ThreadPoolExecutor(max_workers=SCRAPE_WORKERS, thread_name_prefix="scrape") as scrape_ex, \
+             ThreadPoolExecutor(max_workers=3, thread_name_prefix="sweep") as sweep_ex:
+            queue = _ScrapeQueue(scrape_ex)
+            queue.add(batch)
+            sweeps = [
+                sweep_ex.submit(_sweep, "check_parked_users", check_parked_users),
+                sweep_ex.submit(_sweep, "precheck_new_users", precheck_new_users, lookup=scrape_ex),
+                sweep_ex.submit(_sweep, "transfer_firestore_to_main", transfer_firestore_to_main,
+                                on_rows=queue.add),
+            ]
+            for f in sweeps:
+                f.result()
+            results = queue.results()
+        scrape_s = queue.done_at - queue.started_at
+        metrics.observe("phase_seconds", scrape_s, phase="scrape_main")
+        metrics.set("phase_last_seconds", scrape_s, phase="scrape_main")
+        _apply_results(results)
+    with metrics.phase("export"):
+        scraped.export_scraped(SCRAPED_TXT)
+        feed.update()
+        hotspots.update()
+        n_unresolved = resolver.write_report(UNRESOLVED_TXT)
+    if n_unresolved:
+        dbg(f"⚠ {n_unresolved} location string(s) never resolved – see {UNRESOLVED_TXT.name}")
+    metrics.inc("cycles_total")
+    dbg("Done – scraping cycle complete", event="cycle",
+        seconds = round(time.monotonic() - t0, 3),
+        plates  = metrics.get("plates_total", result="ok") - plates0,
+        tickets = metrics.get("tickets_saved_total") - saved0,
+        emails_queued = mailer.pending() if started(mailer) else 0)
+
+    # deploys off the scraping loop, and only if public/ actually changed
+    publisher.request()
+    export_metrics()
 
 def print_ticket_and_user_stats():
-    # Print number of tickets in scraped.txt
-    if SCRAPED_TXT.exists():
-        num_tickets = sum(1 for _ in SCRAPED_TXT.read_text("utf-8").splitlines() if _.strip())
-    else:
-        num_tickets = 0
+    # Print number of tickets in the store
+    num_tickets = scraped.count()
     # Print number of users in main.txt
     if MAIN_PATH.exists():
         num_users = sum(1 for _ in MAIN_PATH.read_text("utf-8").splitlines() if _.strip())
     else:
         num_users = 0
-    dbg(f"Loaded {num_tickets} tickets already in scraped.txt")
+    dbg(f"Loaded {num_tickets} tickets already in tickets.db")
     dbg(f"Total users: {num_users}")
 
-if __name__ == "__main__":
+def shutdown(final_metrics: bool = False):
+    """Stop whatever this process started, draining queues first."""
+    for w in watches.values():
+        w.close()
+    if started(publisher):
+        publisher.close()
+    # pending digests go to the mailer before it drains
+    if started(alerts):
+        alerts.close()
+    if started(mailer):
+        mailer.close()
+        dbg(f"Mailer drained ✔ ({mailer.sent} sent, {mailer.failed} failed)")
+    # one-off commands leave the running loop's metrics file alone
+    if final_metrics:
+        export_metrics()
+    if started(pool):
+        dbg(f"Chrome: {pool.report()}")
+        pool.quit()
+        dbg("Chrome closed ✔")
+    if started(scraped):
+        scraped.close()
+
+def cmd_run(args):
+    # fail fast on missing credentials instead of at the first email or sweep
+    ensure(db, mailer)
+    start_watches()
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
     while not _stop.is_set():
         run_cycle()
+        if args.once:
+            break
+        _changed.clear()
         for remaining in range(5, 0, -1):
             dbg(f"Next cycle starts in {remaining} second{'s' if remaining != 1 else ''}…")
-            time.sleep(1)
+            if _changed.wait(1):
+                dbg("Firestore change received – starting next cycle now")
+                break
         dbg("Here we go again baby!")
         print_ticket_and_user_stats()
 
-    driver.quit()
-    dbg("Chrome closed ✔")
+def cmd_stats(args):
+    print_ticket_and_user_stats()
+
+def cmd_lookup(args):
+    ok, tickets = process(args.plate, args.citation)
+    print(json.dumps({"ok": ok, "tickets": tickets}, indent=1))
+    return 0 if ok else 1
+
+def cmd_sweep_users(args):
+    with metrics.phase("subscribers_refresh"):
+        metrics.inc("firestore_reads_total", subscribers.refresh(), collection=subscribers.col)
+    with metrics.phase("check_parked_users"):
+        check_parked_users()
+    with metrics.phase("precheck_new_users"):
+        precheck_new_users()
+    with metrics.phase("transfer_firestore_to_main"):
+        transfer_firestore_to_main()
 
+def cmd_publish(args):
+    scraped.export_scraped(SCRAPED_TXT)
+    feed.update()
+    hotspots.update()
+    publisher.request()
+    # deploys now if public/ changed, and waits for it
+    return 0 if publisher.flush() and publisher.status.get("last_ok", True) else 1
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="TAPS ticket scraper and alerter.")
+    sub = ap.add_subparsers(dest="cmd")
+    run = sub.add_parser("run", help="scrape, alert and publish in a loop (default)")
+    run.add_argument("--once", action="store_true", help="stop after one cycle")
+    run.set_defaults(func=cmd_run)
+    sub.add_parser("stats", help="ticket and main.txt counts").set_defaults(func=cmd_stats)
+    lookup = sub.add_parser("lookup", help="look up one citation and store what it finds")
+    lookup.add_argument("plate")
+    lookup.add_argument("citation")
+    lookup.set_defaults(func=cmd_lookup)
+    sub.add_parser("sweep-users", help="one pass over the Firestore user collections"
+                   ).set_defaults(func=cmd_sweep_users)
+    sub.add_parser("publish", help="export scraped.txt and the feed, then deploy if changed"
+                   ).set_defaults(func=cmd_publish)
+    args = ap.parse_args(argv)
+    if args.cmd is None:
+        args = ap.parse_args(["run", *(argv or [])])
+    try:
+        return args.func(args) or 0
+    except KeyboardInterrupt:
+        dbg("Interrupted – shutting down")
+        return 130
+    finally:
+        shutdown(final_metrics=args.func is cmd_run)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""In-memory plate → current_users index for "you just got a ticket" emails.
+
+The first refresh() streams all of current_users. After that, each
+refresh() only asks for documents whose lastUpdated is past the newest one
+already seen. A full rebuild runs every `full_every` seconds to pick up
+deleted users and docs with no lastUpdated.
+"""
+import threading
+import time
+
+from util import dbg
+
+def plate_key(plate: str) -> str:
+    return "".join((plate or "").split()).upper()
+
+class SubscriberIndex:
+    def __init__(self, db, col: str = "current_users", full_every: float = 6 * 3600):
+        self.db         = db
+        self.col        = col
+        self.full_every = full_every
+        self._by_plate  = {}     # plate → {doc id: (email, full name)}
+        self._plate_of  = {}     # doc id → plate, so a changed plate moves
+        self._cursor    = None   # newest lastUpdated seen
+        self._built_at  = 0.0
+        self._lock      = threading.Lock()
+
+    def __len__(self):
+        return len(self._plate_of)
+
+    def _put(self, doc_id: str, d: dict):
+        old = self._plate_of.pop(doc_id, None)
+        if old is not None:
+            self._by_plate.get(old, {}).pop(doc_id, None)
+        plate = plate_key(d.get("licensePlate"))
+        if plate and d.get("email"):
+            self._by_plate.setdefault(plate, {})[doc_id] = (d["email"], d.get("fullName") or "User")
+            self._plate_of[doc_id] = plate
+        ts = d.get("lastUpdated")
+        if ts is not None and hasattr(ts, "timestamp") and (self._cursor is None or ts > self._cursor):
+            self._cursor = ts
+
+    def add(self, doc_id: str, plate: str, email: str, full: str):
+        """Record a user we just wrote ourselves, ahead of the next refresh."""
+        with self._lock:
+            self._put(doc_id, {"licensePlate": plate, "email": email, "fullName": full})
+
+    def refresh(self) -> int:
+        """Pull changed (or, periodically, all) users; returns documents read."""
+        full = self._cursor is None or time.monotonic() - self._built_at > self.full_every
+        q = self.db.collection(self.col)
+        if not full:
+            q = q.where("lastUpdated", ">", self._cursor)
+        docs = list(q.stream())
+        with self._lock:
+            if full:
+                self._by_plate, self._plate_of, self._cursor = {}, {}, None
+                self._built_at = time.monotonic()
+            for doc in docs:
+                self._put(doc.id, doc.to_dict() or {})
+        dbg(f"Subscriber index {'rebuilt' if full else 'refreshed'}: "
+            f"{len(docs)} doc(s) read, {len(self)} user(s) indexed")
+        return len(docs)
+
+    def lookup(self, plate: str):
+        """[(email, full name)] of users watching `plate`."""
+        with self._lock:
+            return list(self._by_plate.get(plate_key(plate), {}).values())
@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("selenium")
+from selenium.common.exceptions import InvalidSessionIdException, TimeoutException
+
+import browser
+
+class FakeSession(browser.BrowserSession):
+    """A session without Chrome behind it."""
+
+    def __init__(self):
+        self.name     = "fake"
+        self.pages    = 0
+        self.errors   = 0
+        self.restarts = 0
+
+    def rss_mb(self):
+        return None
+
+def _pool(max_errors=3):
+    pool = browser.BrowserPool.__new__(browser.BrowserPool)
+    pool.max_errors, pool.max_pages, pool.max_rss_mb = max_errors, 500, 1024
+    return pool
+
+def test_wait_timeouts_do_not_recycle():
+    s, pool = FakeSession(), _pool()
+    for _ in range(3):
+        s.record_error(TimeoutException("no ticket found"))
+    assert s.errors == 0
+    assert pool._recycle_reason(s) is None
+
+def test_broken_driver_recycles():
+    s, pool = FakeSession(), _pool()
+    for _ in range(3):
+        s.record_error(InvalidSessionIdException("session gone"))
+    assert pool._recycle_reason(s) == "3 WebDriver errors in a row"
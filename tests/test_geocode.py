@@ -0,0 +1,41 @@
+import json
+
+import geocode
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.data        = data
+        self.status_code = status_code
+        self.ok          = status_code < 400
+
+    def json(self):
+        return self.data
+
+class FakeHttp:
+    """Answers each query from `answers`, keyed by the query text."""
+
+    def __init__(self, answers):
+        self.answers = answers
+
+    def get(self, url, params=None, timeout=None):
+        return FakeResponse(self.answers[params["input"]])
+
+def _geocoder(tmp_path, answers):
+    geo = geocode.Geocoder(tmp_path / "cache.json", url="http://stub", key=None,
+                           rate=1000, workers=2, attempts=2, backoff=0, hint="")
+    geo._http = FakeHttp(answers)
+    return geo
+
+def test_candidate_without_geometry_fails_only_that_name(tmp_path):
+    geo = _geocoder(tmp_path, {
+        "LOT 101": {"status": "OK", "candidates": [{"geometry": {"location": {"lat": 37.0, "lng": -122.0}}}]},
+        "LOT 102": {"status": "OK", "candidates": [{"name": "no geometry here"}]},
+    })
+    coords, errors = geo.geocode([("Lot 101", "Lot 101"), ("Lot 102", "Lot 102")])
+    assert coords["Lot 101"] == (37.0, -122.0)
+    assert coords["Lot 102"] is None
+    assert list(errors) == ["LOT 102"]
+    assert "malformed candidate" in errors["LOT 102"]
+    # the good answer still made it to the cache; the bad one is asked again next run
+    cached = json.loads((tmp_path / "cache.json").read_text("utf-8"))
+    assert "LOT 101" in cached and "LOT 102" not in cached
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""SQLite (WAL) store of every scraped ticket, keyed by citation.
+
+This replaces the in-memory `scraped` set plus scraped.txt append-and-dedup.
+Inserts are transactional and idempotent: a citation is stored once. The
+public scraped.txt is now an export. export_scraped() appends only rows
+added since the last export and does a full rewrite only if the file was
+changed behind its back.
+"""
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+from util import dbg
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    citation   TEXT NOT NULL UNIQUE,
+    location   TEXT NOT NULL,
+    clock      TEXT NOT NULL,          -- HHMM, as written to scraped.txt
+    issue_date TEXT NOT NULL,          -- YYYY-MM-DD
+    plate      TEXT,
+    added_at   TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE INDEX IF NOT EXISTS ix_tickets_location   ON tickets(location);
+CREATE INDEX IF NOT EXISTS ix_tickets_issue_date ON tickets(issue_date);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_RECORD = re.compile(r'"([^"]*)"')
+
+def scraped_line(citation, location, clock, issue_date) -> str:
+    y, m, d = (int(x) for x in issue_date.split("-"))
+    return f'"{citation},{location},{clock},{m}/{d}/{y}",\n'
+
+class TicketStore:
+    def __init__(self, path: Path):
+        self.path  = Path(path)
+        self._lock = threading.Lock()
+        self._db   = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    # ── meta ──────────────────────────────────────────────────────
+    def _meta(self, key: str, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value):
+        self._db.execute(
+            "INSERT INTO meta(key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, str(value)),
+        )
+
+    # ── reads ─────────────────────────────────────────────────────
+    def __contains__(self, citation: str) -> bool:
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM tickets WHERE citation = ?", (citation.upper(),)
+            ).fetchone() is not None
+
+    def has_all(self, citations) -> bool:
+        ids = {c.upper() for c in citations}
+        if not ids:
+            return True
+        with self._lock:
+            n = self._db.execute(
+                f"SELECT COUNT(*) FROM tickets WHERE citation IN ({','.join('?' * len(ids))})",
+                tuple(ids),
+            ).fetchone()[0]
+        return n == len(ids)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+
+    def since(self, after_id: int = 0):
+        """[(id, citation, location, clock, issue_date)] with id > after_id, oldest first."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, citation, location, clock, issue_date FROM tickets "
+                "WHERE id > ? ORDER BY id", (after_id,)
+            ).fetchall()
+
+    def month(self, ym: str):
+        """[(id, citation, location, clock, issue_date)] issued in month "YYYY-MM"."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, citation, location, clock, issue_date FROM tickets "
+                "WHERE issue_date >= ? AND issue_date < ? ORDER BY issue_date, clock, citation",
+                (f"{ym}-00", f"{ym}-99"),
+            ).fetchall()
+
+    def latest(self, n: int):
+        """The n most recently added tickets, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, citation, location, clock, issue_date FROM tickets "
+                "ORDER BY id DESC LIMIT ?", (n,)
+            ).fetchall()
+        return rows[::-1]
+
+    def get_meta(self, key: str, default=None):
+        with self._lock:
+            return self._meta(key, default)
+
+    def set_meta(self, key: str, value):
+        with self._lock:
+            self._set_meta(key, value)
+
+    # ── writes ────────────────────────────────────────────────────
+    def add(self, citation: str, location: str, clock: str, m: int, d: int, y: int, plate: str = None) -> bool:
+        """Store a ticket; False if the citation was already there."""
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO tickets(citation, location, clock, issue_date, plate) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (citation.upper(), location, clock, f"{y:04d}-{m:02d}-{d:02d}", plate),
+            )
+            return cur.rowcount == 1
+
+    def import_scraped(self, path: Path) -> int:
+        """One-time load of an existing scraped.txt; it counts as already exported. Returns rows stored."""
+        path = Path(path)
+        if not path.exists():
+            return 0
+        rows = []
+        for rec in _RECORD.findall(path.read_text("utf-8")):
+            parts = [p.strip() for p in rec.split(",")]
+            if len(parts) != 4:
+                continue
+            cid, loc, clock, date = parts
+            try:
+                m, d, y = map(int, date.split("/"))
+            except ValueError:
+                continue
+            rows.append((cid.upper(), loc, clock, f"{y:04d}-{m:02d}-{d:02d}"))
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                before = self._db.total_changes
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO tickets(citation, location, clock, issue_date) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                # duplicate citations in the file are ignored, so count what was stored
+                inserted = self._db.total_changes - before
+                last = self._db.execute("SELECT COALESCE(MAX(id), 0) FROM tickets").fetchone()[0]
+                self._set_meta("exported_id", last)
+                self._set_meta("exported_size", path.stat().st_size)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return inserted
+
+    def export_scraped(self, path: Path) -> int:
+        """Bring scraped.txt up to date; returns how many lines were written."""
+        path = Path(path)
+        with self._lock:
+            last = int(self._meta("exported_id", 0))
+            size = int(self._meta("exported_size", -1))
+        full = not path.exists() or path.stat().st_size != size
+        rows = self.since(0 if full else last)
+        if not rows and not full:
+            return 0
+        text = "".join(scraped_line(*r[1:]) for r in rows)
+        if full:
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(text, encoding="utf-8")
+            tmp.replace(path)
+        else:
+            with path.open("a", encoding="utf-8") as f:
+                f.write(text)
+        with self._lock:
+            if rows:
+                self._set_meta("exported_id", rows[-1][0])
+            self._set_meta("exported_size", path.stat().st_size)
+        dbg(f"{'Re-exported' if full else 'Appended'} {len(rows)} ticket(s) → {path.name}")
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
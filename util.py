@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import json
+import math
+import os
+import threading
+import time
+import datetime as dt
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+def utc_tz():
+    try:
+        return ZoneInfo("UTC") if ZoneInfo else dt.timezone.utc
+    except Exception:
+        return dt.timezone.utc
+
+# LOG_FORMAT=json: one JSON object per line (ts, thread, msg and any fields)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+def dbg(msg: str, **fields):
+    ts = dt.datetime.now().isoformat(timespec='seconds')
+    if LOG_FORMAT == "json":
+        rec = {"ts": ts, "thread": threading.current_thread().name, "msg": msg, **fields}
+        print(json.dumps(rec, default=str, ensure_ascii=False), flush=True)
+    elif fields:
+        print(f"[{ts}] {msg} | " + " ".join(f"{k}={v}" for k, v in fields.items()))
+    else:
+        print(f"[{ts}] {msg}")
+
+def haversine(lat1, lon1, lat2, lon2) -> float:
+    R = 3958.8  # miles
+    f1, f2 = math.radians(lat1), math.radians(lat2)
+    d_f, d_l = math.radians(lat2 - lat1), math.radians(lon2 - lon1)
+    a = math.sin(d_f / 2)**2 + math.cos(f1)*math.cos(f2)*math.sin(d_l / 2)**2
+    return 2 * R * math.asin(math.sqrt(a)) * 5280  # feet
+
+class TokenBucket:
+    """Allows `rate` events per `per` seconds, with bursts up to `burst`."""
+
+    def __init__(self, rate: float, per: float = 1.0, burst: float = None):
+        self.rate   = rate / per
+        self.burst  = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.stamp  = time.monotonic()
+        self._lock  = threading.Lock()
+
+    def wait(self, stop: threading.Event = None) -> bool:
+        """Block until a token is free; False if `stop` was set meanwhile."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp  = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                delay = (1 - self.tokens) / self.rate
+            if stop is not None:
+                if stop.wait(delay):
+                    return False
+            else:
+                time.sleep(delay)
+
+class Lazy:
+    """Stands in for `factory()`'s result and builds it on first use.
+
+    Attribute access, `in`, len() and iteration go to the real object, so
+    module-level resources can be declared up front but only paid for by
+    the code paths that touch them.
+    """
+    __slots__ = ("_factory", "_obj", "_lock")
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._obj     = None
+        self._lock    = threading.Lock()
+
+    def _get(self):
+        if self._obj is None:
+            with self._lock:
+                if self._obj is None:
+                    self._obj = self._factory()
+        return self._obj
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __contains__(self, item):
+        return item in self._get()
+
+    def __len__(self):
+        return len(self._get())
+
+    def __iter__(self):
+        return iter(self._get())
+
+def started(obj) -> bool:
+    """False for a Lazy that hasn't been built yet."""
+    return not isinstance(obj, Lazy) or obj._obj is not None
+
+def ensure(*objs):
+    """Build these Lazy objects now, e.g. to fail fast on missing credentials."""
+    for obj in objs:
+        if isinstance(obj, Lazy):
+            obj._get()